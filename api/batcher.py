@@ -0,0 +1,62 @@
+import time
+import asyncio
+import logging
+from .metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into batched calls.
+
+    Texts arriving within `max_wait` seconds of the first waiting one, up to
+    `max_batch_size` of them, are sent together through `embed_many`, which
+    takes a list of texts and returns their embeddings in order. Identical
+    texts in one batch are embedded once.
+    """
+
+    def __init__(self, embed_many, max_batch_size=16, max_wait=0.005):
+        self.embed_many = embed_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        # The loop only keeps weak references to tasks, so in-flight sends are held here
+        self._tasks = set()
+
+    async def embed(self, text):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        sent_at = time.perf_counter()
+        for _, _, queued_at in batch:
+            EMBEDDING_BATCH_WAIT_SECONDS.observe(sent_at - queued_at)
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        try:
+            embeddings = dict(zip(texts, await self.embed_many(texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+import numpy as np
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    "search": "/search/",
+    "search_multiple": "/search_multiple/",
+}
+BENCHMARK_API_KEY = "benchmark-key"
+
+
+class Latency:
+    """Log-normal latency distribution described by its median and p99, in seconds."""
+
+    def __init__(self, median=0.05, p99=None):
+        self.median = median
+        p99 = p99 if p99 is not None else median
+        # 2.326 is the z-score of the 99th percentile
+        self.sigma = math.log(p99 / median) / 2.326 if median > 0 and p99 > median else 0.0
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+    def to_dict(self):
+        return {"median": self.median, "sigma": self.sigma}
+
+
+class Upstream:
+    """Latency and failure behaviour of one fake upstream endpoint."""
+
+    def __init__(self, latency, error_rate=0.0, error_status=500):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    async def respond(self, body):
+        await asyncio.sleep(self.latency.sample())
+        if random.random() < self.error_rate:
+            return JSONResponse({"error": {"message": "Injected benchmark failure"}}, status_code=self.error_status)
+        return body
+
+    def to_dict(self):
+        return {"latency": self.latency.to_dict(), "error_rate": self.error_rate, "error_status": self.error_status}
+
+
+def fake_embedding(text, dimensions):
+    # Deterministic per text, so repeated queries behave like real ones
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_openai_app(embeddings, chat, dimensions=3072):
+    """OpenAI stand-in serving embeddings, chat completions and model lookups."""
+    app = FastAPI()
+
+    @app.get("/v1/models/{model}")
+    async def retrieve_model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "benchmark"}
+
+    @app.post("/v1/embeddings")
+    async def create_embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        size = body.get("dimensions") or dimensions
+        data = [{"object": "embedding", "index": i, "embedding": fake_embedding(text, size)} for i, text in enumerate(inputs)]
+        return await embeddings.respond({
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    @app.post("/v1/chat/completions")
+    async def create_chat_completion(request: Request):
+        body = await request.json()
+        if body.get("response_format"):
+            content = json.dumps({"matches": [{"i": i, "why": "Mentions the query topic"} for i in range(1, 6)]})
+        elif "Best match:" in body["messages"][-1]["content"]:
+            content = "Best match: 1\nBrief explanation: Mentions the query topic"
+        else:
+            content = "\n".join(f"{i}. {i}\n   Explanation: Mentions the query topic" for i in range(1, 6))
+        return await chat.respond({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    return app
+
+
+def fake_pinecone_app(query, host, dimension=3072):
+    """Pinecone stand-in serving the control plane describe call and data plane queries."""
+    app = FastAPI()
+
+    @app.get("/indexes/{name}")
+    async def describe_index(name: str):
+        return {
+            "name": name,
+            "dimension": dimension,
+            "metric": "cosine",
+            "host": host,
+            "vector_type": "dense",
+            "deletion_protection": "disabled",
+            "spec": {"serverless": {"cloud": "aws", "region": "us-east-1"}},
+            "status": {"ready": True, "state": "Ready"},
+            # Newer clients read the shape from `schema` and `deployment` instead of the fields above
+            "schema": {"fields": {"embedding": {"type": "dense_vector", "dimension": dimension, "metric": "cosine"}}},
+            "deployment": {"deployment_type": "managed", "cloud": "aws", "region": "us-east-1"},
+        }
+
+    @app.post("/describe_index_stats")
+    async def describe_index_stats():
+        return {"namespaces": {}, "dimension": dimension, "indexFullness": 0.0, "totalVectorCount": 0}
+
+    @app.post("/query")
+    async def query_index(request: Request):
+        body = await request.json()
+        top_k = body.get("topK", 10)
+        matches = [
+            {
+                "id": f"video{i}_{i * 30}",
+                "score": round(0.9 - i * 0.02, 4),
+                "values": [],
+                "metadata": {"id": f"video{i}", "start_time": float(i * 30), "text": f"Transcript segment {i} about the query topic. " * 8},
+            }
+            for i in range(top_k)
+        ]
+        return await query.respond({"matches": matches, "namespace": "", "usage": {"readUnits": 1}})
+
+    return app
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app, port):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (in milliseconds) for one run."""
+    completed = len(latencies)
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).round(2).tolist() if completed else (None, None, None)
+    return {
+        "requests": completed + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+    }
+
+
+async def drive(base_url, path, concurrency, requests, api_key=BENCHMARK_API_KEY, timeout=60.0):
+    """Send `requests` distinct queries to `path` with `concurrency` workers."""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": api_key}, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                # Distinct texts keep the response and embedding caches out of the measurement
+                start_time = time.perf_counter()
+                try:
+                    response = await client.post(path, json={"text": f"benchmark query {i} {random.random()}"})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start_time)
+                else:
+                    errors += 1
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start_time
+    return summarize(latencies, errors, elapsed)
+
+
+def start_api(port, openai_url, pinecone_url, env=None):
+    """Start the API under uvicorn in a subprocess pointed at the fake upstreams."""
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "PINECONE_API_KEY": "benchmark",
+        "PINECONE_CONTROLLER_HOST": pinecone_url,
+        "API_KEY_HASH": hashlib.sha256(BENCHMARK_API_KEY.encode()).hexdigest(),
+        "EMBEDDING_CACHE_PATH": "",
+        **(env or {}),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/version-check").status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API server did not start within 30 seconds")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(endpoints, concurrency_levels, requests, embeddings, chat, pinecone, warmup=10, env=None):
+    openai_port, pinecone_port, api_port = free_port(), free_port(), free_port()
+    pinecone_url = f"http://127.0.0.1:{pinecone_port}"
+    report = {
+        "commit": git_commit(),
+        "timestamp": int(time.time()),
+        "config": {
+            "requests": requests,
+            "upstreams": {"embeddings": embeddings.to_dict(), "chat": chat.to_dict(), "pinecone": pinecone.to_dict()},
+            "env": env or {},
+        },
+        "results": [],
+    }
+    with ServerThread(fake_openai_app(embeddings, chat), openai_port), \
+            ServerThread(fake_pinecone_app(pinecone, pinecone_url), pinecone_port):
+        process, base_url = start_api(api_port, f"http://127.0.0.1:{openai_port}", pinecone_url, env)
+        try:
+            for endpoint in endpoints:
+                path = ENDPOINTS[endpoint]
+                asyncio.run(drive(base_url, path, 1, warmup))
+                for concurrency in concurrency_levels:
+                    result = asyncio.run(drive(base_url, path, concurrency, requests))
+                    logger.info(f"{endpoint} concurrency={concurrency}: {result['requests_per_second']} req/s, p99 {result['p99_ms']} ms")
+                    report["results"].append({"endpoint": endpoint, "concurrency": concurrency, **result})
+        finally:
+            process.terminate()
+            process.wait()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the search endpoints against local OpenAI and Pinecone stand-ins")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent before each endpoint")
+    parser.add_argument("--embedding-latency", type=float, nargs=2, default=[0.03, 0.15], metavar=("MEDIAN", "P99"))
+    parser.add_argument("--chat-latency", type=float, nargs=2, default=[0.4, 1.5], metavar=("MEDIAN", "P99"))
+    parser.add_argument("--pinecone-latency", type=float, nargs=2, default=[0.02, 0.1], metavar=("MEDIAN", "P99"))
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures, e.g. 429")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra environment for the API server")
+    parser.add_argument("--out", default="benchmark.json", help="File to write the JSON report to")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    report = run_benchmark(
+        args.endpoints,
+        args.concurrency,
+        args.requests,
+        embeddings=Upstream(Latency(*args.embedding_latency), args.error_rate, args.error_status),
+        chat=Upstream(Latency(*args.chat_latency), args.error_rate, args.error_status),
+        pinecone=Upstream(Latency(*args.pinecone_latency), args.error_rate, args.error_status),
+        warmup=args.warmup,
+        env=dict(item.split("=", 1) for item in args.env),
+    )
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote benchmark results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
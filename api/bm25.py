@@ -0,0 +1,219 @@
+import os
+import json
+import math
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+import numpy as np
+from .prompt import WORD_PATTERN, STOPWORDS
+from .local_index import MetadataWriter, MetadataReader, top_k
+from .filters import FieldIndex
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_FILE = "vocabulary.json"
+POSTINGS_FILE = "postings.npz"
+
+
+def tokenize(text):
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25IndexWriter:
+    """Builds a BM25 inverted index over transcript chunks.
+
+    Postings are written as flat arrays: for each term, a slice of document
+    positions and term frequencies addressed by an offsets array. Adding an
+    ID that is already indexed is a no-op. With `append=True` the documents of
+    an index already at `path` are kept, so incremental runs add to it.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self._postings = defaultdict(list)
+        self._existing_postings = {}
+        self._doc_lengths = []
+        self._ids = set()
+        existing = self._load_existing() if append and os.path.exists(os.path.join(path, POSTINGS_FILE)) else None
+        self._metadata = MetadataWriter(path)
+        if existing is not None:
+            vocabulary, offsets, docs, tfs, doc_lengths, rows = existing
+            for i, term in enumerate(vocabulary):
+                self._existing_postings[term] = (docs[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+            self._doc_lengths = doc_lengths.tolist()
+            for id, metadata in rows:
+                self._metadata.add(id, metadata)
+                self._ids.add(id)
+
+    def _load_existing(self):
+        # Read fully into memory, since close() rewrites these files
+        with open(os.path.join(self.path, VOCABULARY_FILE)) as f:
+            vocabulary = json.load(f)
+        with np.load(os.path.join(self.path, POSTINGS_FILE)) as data:
+            offsets, docs, tfs, doc_lengths = data["offsets"], data["docs"], data["tfs"], data["doc_lengths"]
+        reader = MetadataReader(self.path)
+        try:
+            rows = list(reader)
+        finally:
+            reader.close()
+        logger.info(f"Keeping {len(rows)} documents of the existing BM25 index at {self.path}")
+        return vocabulary, offsets, docs, tfs, doc_lengths, rows
+
+    def add(self, id, text, metadata):
+        if id in self._ids:
+            return
+        self._ids.add(id)
+        position = len(self._doc_lengths)
+        terms = tokenize(text)
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        for term, count in counts.items():
+            self._postings[term].append((position, count))
+        self._doc_lengths.append(len(terms))
+        self._metadata.add(id, metadata)
+
+    def _term_postings(self, term):
+        docs, tfs = self._existing_postings.get(term, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16)))
+        if term in self._postings:
+            # New documents come after the existing ones, so positions stay sorted and unique
+            postings = np.array(self._postings[term], dtype=np.int64)
+            docs = np.concatenate([docs, postings[:, 0]])
+            tfs = np.concatenate([tfs, np.minimum(postings[:, 1], np.iinfo(np.uint16).max)])
+        return docs, tfs
+
+    def close(self):
+        self._metadata.close()
+        vocabulary = sorted(set(self._postings) | set(self._existing_postings))
+        postings = [self._term_postings(term) for term in vocabulary]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(term_docs) for term_docs, _ in postings])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, (term_docs, term_tfs) in enumerate(postings):
+            docs[offsets[i]:offsets[i + 1]] = term_docs
+            tfs[offsets[i]:offsets[i + 1]] = term_tfs
+        np.savez(os.path.join(self.path, POSTINGS_FILE), offsets=offsets, docs=docs, tfs=tfs,
+                 doc_lengths=np.array(self._doc_lengths, dtype=np.int32))
+        with open(os.path.join(self.path, VOCABULARY_FILE), "w") as f:
+            json.dump(vocabulary, f)
+        logger.info(f"Wrote BM25 index with {len(self._doc_lengths)} documents and {len(vocabulary)} terms to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BM25Index:
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(path, VOCABULARY_FILE)) as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+        with np.load(os.path.join(path, POSTINGS_FILE)) as data:
+            self.offsets = data["offsets"]
+            self.docs = data["docs"]
+            self.tfs = data["tfs"]
+            self.doc_lengths = data["doc_lengths"]
+        self.count = len(self.doc_lengths)
+        self.average_length = float(self.doc_lengths.mean()) if self.count else 0.0
+        self.metadata = MetadataReader(path)
+        self.field_index = FieldIndex(self.metadata)
+
+    def scores(self, query):
+        scores = np.zeros(self.count, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.average_length or 1))
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Document positions are unique within a posting list, so fancy-index += is safe
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+        return scores
+
+    def search(self, query, n_results=10, filter=None):
+        scores = self.scores(query)
+        if filter:
+            scores[~self.field_index.mask(filter)] = 0
+        results = []
+        for position in top_k(scores, n_results):
+            if scores[position] <= 0:
+                break
+            id, metadata = self.metadata.row(position)
+            results.append({
+                "id": id,
+                "score": float(scores[position]),
+                "metadata": metadata,
+                "text": metadata.get('text', '')
+            })
+        return results
+
+
+def reciprocal_rank_fusion(result_lists, n_results=10, k=60):
+    """Fuse ranked result lists by summing 1 / (k + rank) per result id.
+
+    The first list's entry is kept for each id, so dense results keep their
+    cosine `score`; the fused value is stored as `fusion_score`.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            entry = fused.setdefault(result['id'], {**result, "fusion_score": 0.0})
+            entry["fusion_score"] += 1 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda result: result["fusion_score"], reverse=True)
+    return ranked[:n_results]
+
+
+class HybridSearch:
+    """Fuses a dense search backend with BM25 results before reranking."""
+
+    def __init__(self, dense, bm25_index, rrf_k=60):
+        self.dense = dense
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+
+    def _sparse_results(self, query_text, n_results, filter=None):
+        if not query_text:
+            return []
+        results = self.bm25_index.search(query_text, n_results, filter=filter)
+        # Sparse-only hits have no cosine score; keep `score` comparable for rerank gating
+        return [{**result, "bm25_score": result["score"], "score": 0.0} for result in results]
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        dense = self.dense.find_nearest(query_embedding, n_results, include_values=include_values, filter=filter)
+        return reciprocal_rank_fusion([dense, self._sparse_results(query_text, n_results, filter)], n_results, self.rrf_k)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        dense, sparse = await asyncio.gather(
+            self.dense.find_nearest_async(query_embedding, n_results, include_values=include_values, filter=filter),
+            asyncio.to_thread(self._sparse_results, query_text, n_results, filter),
+        )
+        return reciprocal_rank_fusion([dense, sparse], n_results, self.rrf_k)
+
+    @property
+    def async_index(self):
+        return getattr(self.dense, "async_index", None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a BM25 index from a local vector index's metadata")
+    parser.add_argument("--local-index", required=True, help="Local index directory to read chunk texts from")
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with BM25IndexWriter(args.out) as writer:
+        for id, metadata in MetadataReader(args.local_index):
+            writer.add(id, metadata.get("text", ""), metadata)
+    print(f"Built BM25 index at {args.out}")
+
+
+if __name__ == "__main__":
+    main()
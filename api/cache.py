@@ -0,0 +1,311 @@
+import os
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings keyed by (model, normalized text).
+
+    Vectors are kept as float32 arrays. When `path` is set the cache is loaded
+    from and periodically written back to a local .npz file, so warm entries
+    survive restarts and cold starts. Writes triggered from the event loop run
+    in a worker thread.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, path=None, autosave_every=16):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.autosave_every = autosave_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_task = None
+        self._unsaved = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _key(self, text, model):
+        return f"{model}\x00{normalize_text(text)}"
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, text, model):
+        key = self._key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text, model, embedding):
+        key = self._key(text, model)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = (time.time(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.autosave_every
+        if should_save:
+            self._autosave()
+        return vector
+
+    def _autosave(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        # Writing the file takes tens of milliseconds, too long to stall the event loop.
+        # While a save is running, the next put after it finishes schedules another
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(asyncio.to_thread(self.save))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = [(key, created, vector) for key, (created, vector) in self._entries.items()
+                       if not self._expired(created)]
+            self._unsaved = 0
+        keys = np.array([key for key, _, _ in entries], dtype=str)
+        created = np.array([created for _, created, _ in entries], dtype=np.float64)
+        lengths = np.array([len(vector) for _, _, vector in entries], dtype=np.int64)
+        vectors = np.concatenate([vector for _, _, vector in entries]) if entries else np.empty(0, dtype=np.float32)
+        tmp_path = f"{self.path}.tmp"
+        # A background save and the exit hook may overlap
+        with self._save_lock:
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, keys=keys, created=created, lengths=lengths, vectors=vectors)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not persist embedding cache to {self.path}: {e}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                keys, created, lengths, vectors = data["keys"], data["created"], data["lengths"], data["vectors"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load embedding cache from {self.path}: {e}")
+            return
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        with self._lock:
+            for i, key in enumerate(keys):
+                if not self._expired(created[i]):
+                    self._entries[str(key)] = (float(created[i]), vectors[offsets[i]:offsets[i + 1]].copy())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} cached embeddings from {self.path}")
+
+
+class ResponseCache:
+    """TTL/LRU cache of endpoint results with single-flight deduplication.
+
+    Concurrent callers for the same key await one shared computation, which
+    runs as its own task so a disconnecting client does not cancel it for the
+    others.
+    """
+
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[0]):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, compute, should_cache=None):
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, compute, should_cache))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute, should_cache):
+        try:
+            result = await compute()
+            if should_cache is None or should_cache(result):
+                self.put(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def stats(self):
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_ratio": (self.hits + self.coalesced) / total if total else 0.0,
+        }
+
+
+class SemanticCache:
+    """Reuses results across paraphrased queries by embedding similarity.
+
+    Query embeddings live in one contiguous float32 matrix, so a lookup is a
+    single matrix-vector product. A lookup hits when the most similar entry in
+    the same namespace has cosine similarity of at least `threshold`. When the
+    matrix is full the least recently used entry is replaced. Namespaces
+    should identify everything the results depend on (endpoint, index, models,
+    index version); `invalidate` drops all entries, e.g. after re-ingestion.
+    """
+
+    def __init__(self, max_size=1024, threshold=0.95, ttl=None):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._values = [None] * max_size
+        self._namespaces = np.full(max_size, -1, dtype=np.int64)
+        self._created = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._namespace_ids = {}
+        self._clock = 0
+
+    def _normalize(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def _namespace_id(self, namespace):
+        return self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+
+    def get(self, namespace, embedding):
+        namespace_id = self._namespace_ids.get(namespace)
+        if self._vectors is None or namespace_id is None or len(embedding) != self._vectors.shape[1]:
+            self.misses += 1
+            return None
+        live = self._namespaces == namespace_id
+        if self.ttl is not None:
+            live &= time.time() - self._created <= self.ttl
+        if not live.any():
+            self.misses += 1
+            return None
+        similarities = self._vectors @ self._normalize(embedding)
+        similarities[~live] = -np.inf
+        slot = int(np.argmax(similarities))
+        if similarities[slot] < self.threshold:
+            self.misses += 1
+            return None
+        self._clock += 1
+        self._last_used[slot] = self._clock
+        self.hits += 1
+        return self._values[slot]
+
+    def put(self, namespace, embedding, value):
+        vector = self._normalize(embedding)
+        if self._vectors is None or self._vectors.shape[1] != len(vector):
+            # A different embedding size invalidates every stored vector
+            self.invalidate()
+            self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+        free = np.flatnonzero(self._namespaces < 0)
+        slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+        self._vectors[slot] = vector
+        self._values[slot] = value
+        self._namespaces[slot] = self._namespace_id(namespace)
+        self._created[slot] = time.time()
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def invalidate(self):
+        self._values = [None] * self.max_size
+        self._namespaces[:] = -1
+        self._namespace_ids.clear()
+
+    def clear(self):
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": int((self._namespaces >= 0).sum()),
+            "max_size": self.max_size,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,93 @@
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "100"))
+KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", "60"))
+PINECONE_POOL_SIZE = int(os.getenv("PINECONE_POOL_SIZE", "100"))
+
+
+def create_async_openai_client():
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+
+class LazyIndex:
+    """Sync Pinecone index that looks up its host on first use.
+
+    The lookup is a blocking control-plane call, so it happens in whichever
+    thread first uses the index rather than when the component is built.
+    """
+
+    def __init__(self, pc, index_name, host=None):
+        self.pc = pc
+        self.index_name = index_name
+        self.host = host
+        self._index = None
+
+    def __getattr__(self, name):
+        if self._index is None:
+            self._index = self.pc.Index(self.index_name, host=self.host or "")
+        return getattr(self._index, name)
+
+
+class LazyAsyncIndex:
+    """Async Pinecone index whose host is looked up in a worker thread on first use.
+
+    Building it never blocks the event loop; with a known `host` there is no lookup at all.
+    """
+
+    def __init__(self, pc, index_name, host=None):
+        self.pc = pc
+        self.index_name = index_name
+        self.host = host
+        self._index = None
+
+    async def _resolve(self):
+        if self._index is None:
+            host = self.host or await asyncio.to_thread(lambda: self.pc.describe_index(self.index_name).host)
+            if self._index is None:
+                self.host = host
+                self._index = self.pc.IndexAsyncio(host=host)
+        return self._index
+
+    async def query(self, **kwargs):
+        return await (await self._resolve()).query(**kwargs)
+
+    async def describe_index_stats(self, **kwargs):
+        return await (await self._resolve()).describe_index_stats(**kwargs)
+
+    async def close(self):
+        if self._index is not None:
+            await self._index.close()
+
+
+def create_async_pinecone_index(pc, index_name, host=None):
+    return LazyAsyncIndex(pc, index_name, host)
+
+
+async def warm_up(async_openai_client=None, async_index=None, embedding_model=None):
+    """Open upstream connections ahead of the first request.
+
+    Failures are logged and ignored; the request path reconnects as needed.
+    """
+    calls = []
+    if async_openai_client is not None and embedding_model:
+        calls.append(async_openai_client.models.retrieve(embedding_model))
+    if async_index is not None:
+        calls.append(async_index.describe_index_stats())
+    for result in await asyncio.gather(*calls, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"Warm-up call failed: {result}")
@@ -0,0 +1,145 @@
+import asyncio
+from collections import defaultdict
+import numpy as np
+
+
+def _start(result):
+    return float(result['metadata'].get('start_time', 0) or 0)
+
+
+def _end(result):
+    end_time = result['metadata'].get('end_time')
+    return float(end_time) if end_time is not None else _start(result)
+
+
+def relevance(result):
+    """The backend's ranking signal: the fused rank score of hybrid results, otherwise `score`."""
+    return result.get('fusion_score', result['score'])
+
+
+def relevance_scores(search_results):
+    scores = np.array([relevance(result) for result in search_results], dtype=np.float32)
+    # Fusion scores are around 1/60; scaled so the best is 1 they weigh against
+    # similarity in MMR the way cosine scores do
+    if any('fusion_score' in result for result in search_results) and len(scores) and scores.max() > 0:
+        scores /= scores.max()
+    return scores
+
+
+def collapse_segments(search_results, max_gap=30.0):
+    """Merge results from the same video whose segments overlap or lie within `max_gap` seconds.
+
+    A merged result keeps the id, scores and vector of its most relevant
+    member, spans from the earliest start to the latest end, and joins the
+    member texts in time order. Results are returned most relevant first.
+    """
+    by_video = defaultdict(list)
+    for result in search_results:
+        by_video[result['metadata'].get('id')].append(result)
+
+    collapsed = []
+    for video_id, results in by_video.items():
+        if video_id is None:
+            collapsed.extend(results)
+            continue
+        results.sort(key=_start)
+        group = [results[0]]
+        group_end = _end(results[0])
+        for result in results[1:]:
+            if _start(result) <= group_end + max_gap:
+                group.append(result)
+                group_end = max(group_end, _end(result))
+            else:
+                collapsed.append(_merge(group))
+                group, group_end = [result], _end(result)
+        collapsed.append(_merge(group))
+    collapsed.sort(key=relevance, reverse=True)
+    return collapsed
+
+
+def _merge(group):
+    if len(group) == 1:
+        return group[0]
+    best = max(group, key=relevance)
+    text = " ".join(result['text'] for result in group if result['text'])
+    metadata = {**best['metadata'], "start_time": _start(group[0]), "text": text}
+    end_time = max(_end(result) for result in group)
+    if end_time > metadata["start_time"]:
+        metadata["end_time"] = end_time
+    return {**best, "metadata": metadata, "text": text, "merged_ids": [result['id'] for result in group]}
+
+
+def mmr(scores, vectors, k, lambda_mult=0.7):
+    """Greedy maximal marginal relevance selection.
+
+    `scores` are the relevance of each candidate to the query and `vectors`
+    their normalized embeddings; returns the selected positions in order.
+    Each step is a single vectorized update of the candidates' maximum
+    similarity to anything already selected.
+    """
+    count = len(scores)
+    k = min(k, count)
+    if k <= 0:
+        return []
+    scores = np.asarray(scores, dtype=np.float32)
+    similarity = vectors @ vectors.T
+    max_similarity = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected = [int(np.argmax(scores))]
+    for _ in range(k - 1):
+        chosen = selected[-1]
+        available[chosen] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, chosen])
+        marginal = lambda_mult * scores - (1 - lambda_mult) * max_similarity
+        marginal[~available] = -np.inf
+        selected.append(int(np.argmax(marginal)))
+    return selected
+
+
+def candidate_vectors(search_results):
+    """Stack the candidates' vectors into a normalized matrix; missing vectors become zero rows."""
+    dim = next((len(result['values']) for result in search_results if result.get('values')), 0)
+    vectors = np.zeros((len(search_results), dim), dtype=np.float32)
+    for i, result in enumerate(search_results):
+        if result.get('values'):
+            vectors[i] = result['values']
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class DiversifiedSearch:
+    """Collapses adjacent segments and diversifies candidates with MMR before reranking.
+
+    `candidates` results are fetched with their vectors, segments of the same
+    video that overlap or nearly touch are merged, and MMR then picks up to
+    `n_results` of what is left. Relevance is the backend's ranking signal
+    (`fusion_score` for hybrid results, `score` otherwise), so hybrid and
+    rescored results keep their ranking, including sparse-only hits.
+    """
+
+    def __init__(self, backend, candidates=30, lambda_mult=0.7, max_gap=30.0):
+        self.backend = backend
+        self.candidates = candidates
+        self.lambda_mult = lambda_mult
+        self.max_gap = max_gap
+
+    def diversify(self, search_results, n_results, include_values=False):
+        collapsed = collapse_segments(search_results, self.max_gap)
+        if len(collapsed) > n_results:
+            selected = mmr(relevance_scores(collapsed), candidate_vectors(collapsed), n_results, self.lambda_mult)
+            collapsed = [collapsed[i] for i in selected]
+        if include_values:
+            return collapsed
+        return [{key: value for key, value in result.items() if key != 'values'} for result in collapsed]
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        results = self.backend.find_nearest(query_embedding, max(n_results, self.candidates), query_text=query_text, include_values=True, filter=filter)
+        return self.diversify(results, n_results, include_values)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        results = await self.backend.find_nearest_async(query_embedding, max(n_results, self.candidates), query_text=query_text, include_values=True, filter=filter)
+        return await asyncio.to_thread(self.diversify, results, n_results, include_values)
+
+    @property
+    def async_index(self):
+        return getattr(self.backend, "async_index", None)
@@ -1,20 +1,121 @@
 import os
-from openai import OpenAI
-from pinecone import Pinecone
-from dotenv import load_dotenv
+import functools
+import numpy as np
+from .clients import create_async_openai_client, create_async_pinecone_index, LazyIndex, PINECONE_POOL_SIZE
+from .lazy import LazyImport, load_environment
+from .batcher import EmbeddingBatcher
+
+load_environment()
+
+OpenAI = LazyImport("openai", "OpenAI")
+Pinecone = LazyImport("pinecone", "Pinecone")
+
+
+def shorten_embedding(embedding, dimensions):
+    """Truncate and re-normalize an embedding, matching the API's `dimensions` parameter."""
+    vector = np.asarray(embedding[:dimensions], dtype=np.float32)
+    return (vector / (np.linalg.norm(vector) or 1)).tolist()
 
-load_dotenv()
 
 class EmbeddingGenerator:
-    def __init__(self, model_name="text-embedding-3-large", index_name="video-data-medium"):
+    def __init__(self, model_name="text-embedding-3-large", index_name="video-data-medium", cache=None, async_client=None, dimensions=None,
+                 batch_window=None, max_batch_size=16, host=None, batch_call=None):
         self.embedding_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model_name = model_name
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index(index_name)
+        self.dimensions = dimensions
+        self.cache = cache
+        # Embeddings of different sizes must not share cache entries
+        self.cache_model = model_name if dimensions is None else f"{model_name}:{dimensions}"
+        self.request_options = {"model": model_name} if dimensions is None else {"model": model_name, "dimensions": dimensions}
+        self.index_name = index_name
+        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), connection_pool_maxsize=PINECONE_POOL_SIZE)
+        # A known host skips the describe call; otherwise it is made on first use
+        self.host = host
+        self.index = LazyIndex(self.pc, index_name, host)
+        self._async_embedding_client = async_client
+        self._async_index = None
+        # With a batch window, concurrent single-query embeddings share one API call.
+        # `batch_call(func, texts)` wraps that call, e.g. to hold an upstream limiter slot per batch
+        embed_many = self._embed_batch_async if batch_call is None else functools.partial(batch_call, self._embed_batch_async)
+        self.batcher = EmbeddingBatcher(embed_many, max_batch_size, batch_window) if batch_window else None
+
+    @property
+    def async_embedding_client(self):
+        if self._async_embedding_client is None:
+            self._async_embedding_client = create_async_openai_client()
+        return self._async_embedding_client
+
+    @property
+    def async_index(self):
+        if self._async_index is None:
+            self._async_index = create_async_pinecone_index(self.pc, self.index_name, self.host)
+        return self._async_index
 
     def generate_embedding(self, text):
-        response = self.embedding_client.embeddings.create(input=[text], model=self.model_name)
-        return response.data[0].embedding[:3072]  # Truncate to 3072 dimensions
+        if self.cache is not None:
+            cached = self.cache.get(text, self.cache_model)
+            if cached is not None:
+                return cached.tolist()
+        response = self.embedding_client.embeddings.create(input=[text], **self.request_options)
+        embedding = response.data[0].embedding
+        if self.cache is not None:
+            self.cache.put(text, self.cache_model, embedding)
+        return embedding
+
+    async def generate_embedding_async(self, text):
+        if self.cache is not None:
+            cached = self.cache.get(text, self.cache_model)
+            if cached is not None:
+                return cached.tolist()
+        if self.batcher is not None:
+            embedding = await self.batcher.embed(text)
+        else:
+            response = await self.async_embedding_client.embeddings.create(input=[text], **self.request_options)
+            embedding = response.data[0].embedding
+        if self.cache is not None:
+            self.cache.put(text, self.cache_model, embedding)
+        return embedding
+
+    async def _embed_batch_async(self, texts):
+        response = await self.async_embedding_client.embeddings.create(input=texts, **self.request_options)
+        return [item.embedding for item in response.data]
+
+    def _lookup_cached(self, texts):
+        embeddings = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(text, self.cache_model) if self.cache is not None else None
+            if cached is not None:
+                embeddings[i] = cached.tolist()
+            else:
+                pending.setdefault(text, []).append(i)
+        return embeddings, pending
+
+    def _fill_batch(self, embeddings, pending, chunk, response):
+        for text, item in zip(chunk, response.data):
+            embedding = item.embedding
+            if self.cache is not None:
+                self.cache.put(text, self.cache_model, embedding)
+            for i in pending[text]:
+                embeddings[i] = embedding
+
+    def generate_embeddings(self, texts, batch_size=2048):
+        embeddings, pending = self._lookup_cached(texts)
+        unique_texts = list(pending)
+        for start in range(0, len(unique_texts), batch_size):
+            chunk = unique_texts[start:start + batch_size]
+            response = self.embedding_client.embeddings.create(input=chunk, **self.request_options)
+            self._fill_batch(embeddings, pending, chunk, response)
+        return embeddings
+
+    async def generate_embeddings_async(self, texts, batch_size=2048):
+        embeddings, pending = self._lookup_cached(texts)
+        unique_texts = list(pending)
+        for start in range(0, len(unique_texts), batch_size):
+            chunk = unique_texts[start:start + batch_size]
+            response = await self.async_embedding_client.embeddings.create(input=chunk, **self.request_options)
+            self._fill_batch(embeddings, pending, chunk, response)
+        return embeddings
 
     def add_to_index(self, id, embedding, metadata):
         self.index.upsert(vectors=[(id, embedding, metadata)])
@@ -0,0 +1,145 @@
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Video ids are stored under `id` in chunk metadata
+VIDEO_ID_FIELD = "id"
+PUBLISHED_FIELD = "published_at"
+
+
+def timestamp(value):
+    """Unix seconds for a date (at midnight UTC), datetime or ISO 8601 string."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def build_filter(channel_id=None, video_id=None, author=None, published_after=None, published_before=None):
+    """Build a Pinecone metadata filter; None when no condition is set.
+
+    Both ends of the date range are inclusive.
+    """
+    conditions = {}
+    for field, value in (("channel_id", channel_id), (VIDEO_ID_FIELD, video_id), ("author", author)):
+        if value is not None:
+            conditions[field] = {"$eq": value}
+    published = {}
+    if published_after is not None:
+        published["$gte"] = timestamp(published_after)
+    if published_before is not None:
+        end = published_before + timedelta(days=1) if type(published_before) is date else published_before
+        published["$lt" if type(published_before) is date else "$lte"] = timestamp(end)
+    if published:
+        conditions[PUBLISHED_FIELD] = published
+    return conditions or None
+
+
+def filter_key(filter):
+    """Canonical string for a filter, for use in cache keys."""
+    return json.dumps(filter, sort_keys=True) if filter else ""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class FieldIndex:
+    """Per-field lookup structures over a metadata sidecar for filtered search.
+
+    Each field is indexed on first use. Categorical fields map every value to
+    a sorted array of row positions; numeric fields keep their values sorted
+    alongside the row order, so range conditions are two binary searches.
+    Filters use the Pinecone syntax: `$eq`, `$ne`, `$in`, `$nin`, `$gt`,
+    `$gte`, `$lt`, `$lte`, plus `$and` / `$or`.
+    """
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.count = metadata.count
+        self._fields = {}
+
+    def _field(self, name):
+        if name not in self._fields:
+            values = [row.get(name) for _, row in self.metadata]
+            present = [value for value in values if value is not None]
+            if present and all(_is_number(value) for value in present):
+                numbers = np.array([value if value is not None else np.nan for value in values], dtype=np.float64)
+                order = np.argsort(numbers, kind="stable")
+                # NaNs (missing values) sort last and are excluded from ranges
+                valid = int(np.count_nonzero(~np.isnan(numbers)))
+                self._fields[name] = ("numeric", numbers[order[:valid]], order[:valid])
+            else:
+                postings = {}
+                for position, value in enumerate(values):
+                    if value is not None:
+                        postings.setdefault(json.dumps(value), []).append(position)
+                self._fields[name] = ("categorical", {value: np.array(positions, dtype=np.int64) for value, positions in postings.items()})
+            logger.info(f"Indexed metadata field {name} over {self.count} rows")
+        return self._fields[name]
+
+    def _positions(self, name, value):
+        field = self._field(name)
+        if field[0] == "numeric":
+            if not _is_number(value):
+                return np.empty(0, dtype=np.int64)
+            sorted_values, order = field[1], field[2]
+            return order[np.searchsorted(sorted_values, value, "left"):np.searchsorted(sorted_values, value, "right")]
+        return field[1].get(json.dumps(value), np.empty(0, dtype=np.int64))
+
+    def _range(self, name, operator, value):
+        field = self._field(name)
+        mask = np.zeros(self.count, dtype=bool)
+        if field[0] != "numeric":
+            return mask
+        sorted_values, order = field[1], field[2]
+        if operator == "$gt":
+            mask[order[np.searchsorted(sorted_values, value, "right"):]] = True
+        elif operator == "$gte":
+            mask[order[np.searchsorted(sorted_values, value, "left"):]] = True
+        elif operator == "$lt":
+            mask[order[:np.searchsorted(sorted_values, value, "left")]] = True
+        else:
+            mask[order[:np.searchsorted(sorted_values, value, "right")]] = True
+        return mask
+
+    def _condition(self, name, condition):
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self.count, dtype=bool)
+        for operator, value in condition.items():
+            if operator in ("$eq", "$in"):
+                matches = np.zeros(self.count, dtype=bool)
+                for item in (value if operator == "$in" else [value]):
+                    matches[self._positions(name, item)] = True
+                mask &= matches
+            elif operator in ("$ne", "$nin"):
+                for item in (value if operator == "$nin" else [value]):
+                    mask[self._positions(name, item)] = False
+            elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                mask &= self._range(name, operator, value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+        return mask
+
+    def mask(self, filter):
+        """Boolean mask of the rows matching `filter`."""
+        mask = np.ones(self.count, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub_filter in condition:
+                    mask &= self.mask(sub_filter)
+            elif key == "$or":
+                matches = np.zeros(self.count, dtype=bool)
+                for sub_filter in condition:
+                    matches |= self.mask(sub_filter)
+                mask &= matches
+            else:
+                mask &= self._condition(key, condition)
+        return mask
@@ -0,0 +1,125 @@
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from .local_index import MetadataReader
+
+logger = logging.getLogger(__name__)
+
+# The metadata the endpoints, reranker and segment merging actually read
+HYDRATED_FIELDS = ("id", "start_time", "end_time", "text")
+
+
+class MetadataStoreWriter:
+    """Builds a SQLite store of the metadata needed to serve results, keyed by vector ID.
+
+    Has the same `add(id, text, metadata)` interface as the other text indexes
+    so ingestion can fill it alongside BM25.
+    """
+
+    def __init__(self, path, fields=HYDRATED_FIELDS, batch_size=1000):
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        self._rows = []
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, metadata TEXT NOT NULL) WITHOUT ROWID")
+
+    def add(self, id, text, metadata):
+        row = {field: metadata[field] for field in self.fields if metadata.get(field) is not None}
+        self._rows.append((id, json.dumps(row, separators=(",", ":"), ensure_ascii=False)))
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?)", self._rows)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MetadataStore:
+    """Read-only lookups of result metadata by vector ID."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def get_many(self, ids):
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._connection.execute(f"SELECT id, metadata FROM chunks WHERE id IN ({placeholders})", list(ids)).fetchall()
+        return {id: json.loads(metadata) for id, metadata in rows}
+
+    def close(self):
+        self._connection.close()
+
+
+class HydratedSearch:
+    """Fills in metadata for a backend that returns only IDs and scores.
+
+    Pairs with `PineconeSearch(include_metadata=False)`: queries carry no
+    transcript text over the wire, and the few fields the API needs are read
+    from a local MetadataStore in one primary-key lookup. Results with no
+    stored metadata, e.g. vectors upserted after the store was built, are
+    dropped rather than served without a video.
+    """
+
+    def __init__(self, backend, store):
+        self.backend = backend
+        self.store = store
+
+    def hydrate(self, search_results):
+        metadata = self.store.get_many([result['id'] for result in search_results])
+        missing = [result['id'] for result in search_results if result['id'] not in metadata]
+        if missing:
+            logger.warning(f"Dropping {len(missing)} results with no stored metadata, e.g. {missing[0]}")
+        hydrated = []
+        for result in search_results:
+            if result['id'] in metadata:
+                result['metadata'] = metadata[result['id']]
+                result['text'] = result['metadata'].get('text', '')
+                hydrated.append(result)
+        return hydrated
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        return self.hydrate(self.backend.find_nearest(query_embedding, n_results, query_text=query_text, include_values=include_values, filter=filter))
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        results = await self.backend.find_nearest_async(query_embedding, n_results, query_text=query_text, include_values=include_values, filter=filter)
+        # A lookup of a few dozen primary keys takes microseconds, so it runs inline
+        return self.hydrate(results)
+
+    @property
+    def async_index(self):
+        return getattr(self.backend, "async_index", None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a metadata store from a local vector index's metadata")
+    parser.add_argument("--local-index", required=True, help="Local index directory to read metadata from")
+    parser.add_argument("--out", required=True, help="Output SQLite file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with MetadataStoreWriter(args.out) as writer:
+        for id, metadata in MetadataReader(args.local_index):
+            writer.add(id, metadata.get("text", ""), metadata)
+    print(f"Built metadata store at {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import urllib.request
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .retry import call_with_retry
+from .embedding import EmbeddingGenerator, shorten_embedding
+from .filters import PUBLISHED_FIELD, timestamp
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_FIELDS = ("text", "start", "start_time", "duration")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def stream_segments(paths):
+    """Yield transcript segments from JSONL files, one JSON object per line."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skipping invalid line {line_number} in {path}: {e}")
+
+
+def content_hash(video_id, start_time, text):
+    return hashlib.sha1(f"{video_id}\x00{start_time:.3f}\x00{text}".encode()).hexdigest()
+
+
+def _make_chunk(segments):
+    first = segments[0]
+    video_id = first["video_id"]
+    start_time = float(first.get("start_time", first.get("start", 0)))
+    text = " ".join(segment["text"].strip() for segment in segments)
+    metadata = {key: value for key, value in first.items() if key not in SEGMENT_FIELDS}
+    metadata.update({"id": video_id, "start_time": start_time, "text": text})
+    # Publish dates are stored as unix seconds so they can be range-filtered
+    published = metadata.pop("publish_date", None) or metadata.get(PUBLISHED_FIELD)
+    if isinstance(published, str):
+        metadata[PUBLISHED_FIELD] = timestamp(published)
+    elif published is not None:
+        metadata[PUBLISHED_FIELD] = published
+    last = segments[-1]
+    if "duration" in last:
+        metadata["end_time"] = float(last.get("start_time", last.get("start", 0))) + float(last["duration"])
+    return {"id": content_hash(video_id, start_time, text), "text": text, "metadata": metadata}
+
+
+def chunk_segments(segments, max_chars=1000):
+    """Merge consecutive segments of the same video into chunks of up to `max_chars`.
+
+    Each chunk keeps the start time of its first segment.
+    """
+    current = []
+    length = 0
+    for segment in segments:
+        if not segment.get("text", "").strip() or "video_id" not in segment:
+            continue
+        if current and (segment["video_id"] != current[0]["video_id"] or length + len(segment["text"]) > max_chars):
+            yield _make_chunk(current)
+            current, length = [], 0
+        current.append(segment)
+        length += len(segment["text"]) + 1
+    if current:
+        yield _make_chunk(current)
+
+
+class Checkpoint:
+    """Append-only record of content hashes that are already upserted."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = open(path, "a") if path else None
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.done
+
+    def record(self, chunk_ids):
+        self.done.update(chunk_ids)
+        if self._file:
+            self._file.write("".join(f"{chunk_id}\n" for chunk_id in chunk_ids))
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class IngestionPipeline:
+    def __init__(self, embedding_generator, index, checkpoint_path=None, embed_batch_size=256,
+                 upsert_batch_size=200, workers=4, max_chars=1000, namespace=None, text_indexes=None,
+                 index_dimensions=None, full_vector_index=None, transcript_store=None):
+        self.embedding_generator = embedding_generator
+        self.index = index
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.workers = workers
+        self.max_chars = max_chars
+        self.namespace = namespace
+        # Indexes built from chunk text alone (e.g. BM25) see every distinct chunk,
+        # including ones skipped because they were upserted in an earlier run
+        self.text_indexes = text_indexes or []
+        # When set, full-size embeddings go to `full_vector_index` (for exact
+        # rescoring) and the upserted vectors are shortened to `index_dimensions`.
+        # Skipped chunks are not re-embedded, so it must keep earlier runs' vectors
+        self.index_dimensions = index_dimensions
+        self.full_vector_index = full_vector_index
+        # Receives every raw segment, for serving the transcript around a match
+        self.transcript_store = transcript_store
+
+    def _upsert(self, vectors):
+        kwargs = {"namespace": self.namespace} if self.namespace else {}
+        call_with_retry(self.index.upsert, vectors=vectors, upstream="pinecone", **kwargs)
+        return [vector[0] for vector in vectors]
+
+    def _recorded(self, segments):
+        for segment in segments:
+            self.transcript_store.add(segment)
+            yield segment
+
+    def _new_chunks(self, chunks, stats):
+        seen = set()
+        for chunk in chunks:
+            stats["chunks"] += 1
+            if chunk["id"] in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(chunk["id"])
+            for text_index in self.text_indexes:
+                text_index.add(chunk["id"], chunk["text"], chunk["metadata"])
+            if chunk["id"] in self.checkpoint:
+                stats["skipped"] += 1
+                continue
+            yield chunk
+
+    def run(self, paths):
+        stats = {"chunks": 0, "skipped": 0, "upserted": 0}
+        start_time = time.time()
+        segments = stream_segments(paths)
+        if self.transcript_store is not None:
+            segments = self._recorded(segments)
+        chunks = self._new_chunks(chunk_segments(segments, self.max_chars), stats)
+        in_flight = set()
+
+        def collect(futures):
+            for future in futures:
+                chunk_ids = future.result()
+                self.checkpoint.record(chunk_ids)
+                stats["upserted"] += len(chunk_ids)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch in batched(chunks, self.embed_batch_size):
+                    embeddings = call_with_retry(self.embedding_generator.generate_embeddings, [chunk["text"] for chunk in batch], upstream="openai")
+                    if self.full_vector_index is not None:
+                        for chunk, embedding in zip(batch, embeddings):
+                            self.full_vector_index.add(chunk["id"], embedding, chunk["metadata"])
+                    if self.index_dimensions:
+                        embeddings = [shorten_embedding(embedding, self.index_dimensions) for embedding in embeddings]
+                    vectors = [(chunk["id"], embedding, chunk["metadata"]) for chunk, embedding in zip(batch, embeddings)]
+                    for upsert_batch in batched(vectors, self.upsert_batch_size):
+                        while len(in_flight) >= self.workers * 2:
+                            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                            collect(done)
+                        in_flight.add(executor.submit(self._upsert, upsert_batch))
+                    elapsed = time.time() - start_time
+                    logger.info(f"Upserted {stats['upserted']} vectors ({stats['upserted'] / elapsed:.1f} vectors/sec), skipped {stats['skipped']}")
+                collect(wait(in_flight).done)
+        finally:
+            self.checkpoint.close()
+            for text_index in self.text_indexes:
+                text_index.close()
+            if self.full_vector_index is not None:
+                self.full_vector_index.close()
+            if self.transcript_store is not None:
+                self.transcript_store.close()
+
+        stats["seconds"] = time.time() - start_time
+        stats["vectors_per_second"] = stats["upserted"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+
+def invalidate_api_caches(url, api_key):
+    """Ask a running API to drop results cached before this ingestion."""
+    request = urllib.request.Request(url, data=b"", method="POST", headers={"X-API-Key": api_key or ""})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            logger.info(f"Invalidated API caches at {url} ({response.status})")
+    except OSError as e:
+        logger.warning(f"Could not invalidate API caches at {url}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed transcript segments from JSONL files and upsert them to Pinecone")
+    parser.add_argument("paths", nargs="+", help="JSONL files with one transcript segment per line")
+    parser.add_argument("--index", required=True, help="Pinecone index name")
+    parser.add_argument("--model", default="text-embedding-3-large")
+    parser.add_argument("--namespace", default=None)
+    parser.add_argument("--checkpoint", default="ingest.checkpoint", help="File recording already indexed chunks")
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--upsert-batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-chars", type=int, default=1000)
+    parser.add_argument("--bm25-index", default=None, help="Also build a BM25 index in this directory")
+    parser.add_argument("--dimensions", type=int, default=None, help="Size of the vectors stored in the index")
+    parser.add_argument("--rescore-index", default=None, help="Also store full-size vectors in this local index for rescoring")
+    parser.add_argument("--transcript-store", default=None, help="Also write all segments to this directory for returning surrounding transcript")
+    parser.add_argument("--metadata-store", default=None, help="Also write result metadata to this SQLite file for slim queries")
+    parser.add_argument("--invalidate-url", default=None, help="POST here after ingesting (e.g. https://host/cache/invalidate), using the API_KEY environment variable")
+    args = parser.parse_args(argv)
+
+    from .bm25 import BM25IndexWriter
+    from .local_index import LocalIndexWriter
+    from .hydrate import MetadataStoreWriter
+    from .transcripts import TranscriptStoreWriter
+    logging.basicConfig(level=logging.INFO)
+    text_indexes = []
+    if args.bm25_index:
+        text_indexes.append(BM25IndexWriter(args.bm25_index, append=True))
+    if args.metadata_store:
+        text_indexes.append(MetadataStoreWriter(args.metadata_store))
+    # Embed at full size when full vectors are kept locally; they are shortened before upserting
+    embedding_generator = EmbeddingGenerator(args.model, args.index, dimensions=None if args.rescore_index else args.dimensions)
+    pipeline = IngestionPipeline(
+        embedding_generator,
+        embedding_generator.index,
+        checkpoint_path=args.checkpoint,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        workers=args.workers,
+        max_chars=args.max_chars,
+        namespace=args.namespace,
+        text_indexes=text_indexes,
+        index_dimensions=args.dimensions if args.rescore_index else None,
+        full_vector_index=LocalIndexWriter(args.rescore_index, append=True) if args.rescore_index else None,
+        transcript_store=TranscriptStoreWriter(args.transcript_store) if args.transcript_store else None,
+    )
+    stats = pipeline.run(args.paths)
+    if args.invalidate_url and stats["upserted"]:
+        invalidate_api_caches(args.invalidate_url, os.getenv("API_KEY"))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import importlib
+
+# Serverless deployments pay for every import on each cold start. In cold-start
+# mode the environment comes from the platform, so .env loading is skipped and
+# nothing is built ahead of the first request that needs it.
+COLD_START_MODE = os.getenv("COLD_START_MODE", "true" if os.getenv("VERCEL") else "false").lower() == "true"
+
+
+class LazyImport:
+    """Stands in for `from <module> import <name>` until the name is first used."""
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self._target = None
+
+    def resolve(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self.module), self.name)
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+
+def load_environment():
+    if not COLD_START_MODE:
+        from dotenv import load_dotenv
+        load_dotenv()
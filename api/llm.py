@@ -1,38 +1,153 @@
-from openai import OpenAI
 import os
+import re
+import json
+from .clients import create_async_openai_client
+from .lazy import LazyImport
+from .prompt import PromptBuilder
+
+OpenAI = LazyImport("openai", "OpenAI")
+
+class RankedMatchParser:
+    """Incrementally parses the numbered ranking format requested by find_best_matches.
+
+    Text can be fed in arbitrary pieces. An explanation may run over several
+    lines, so a (result, explanation) pair is returned once the next match
+    header (or the end of the reply) shows the explanation is complete.
+    """
+
+    def __init__(self, search_results, num_matches):
+        self.search_results = search_results
+        self.headers = tuple(str(i) + '.' for i in range(1, num_matches + 1))
+        self.buffer = ""
+        self.current_match = None
+        self.explanation = None
+
+    def feed(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split('\n')
+        completed = []
+        for line in lines:
+            completed.extend(self._parse_line(line.strip()))
+        return completed
+
+    def close(self):
+        completed = self._parse_line(self.buffer.strip())
+        self.buffer = ""
+        return completed + self._finish_match()
+
+    def _finish_match(self):
+        if self.current_match is None:
+            return []
+        completed = [(self.current_match, " ".join(self.explanation or []))]
+        self.current_match = None
+        self.explanation = None
+        return completed
+
+    def _parse_line(self, line):
+        completed = []
+        if line.startswith(self.headers):
+            completed = self._finish_match()
+            index_match = re.match(r"\d+\.\s*\[?(\d+)", line)
+            index = int(index_match.group(1)) - 1 if index_match else -1
+            self.current_match = self.search_results[index] if 0 <= index < len(self.search_results) else None
+        elif line.startswith("Explanation:") and self.current_match is not None and self.explanation is None:
+            self.explanation = [line.split(':', 1)[1].strip()]
+        elif line and self.explanation is not None:
+            self.explanation.append(line)
+        return completed
+
+
+class RankedJsonParser:
+    """Incrementally parses the structured ranking output.
+
+    The model replies with {"matches": [{"i": <index>, "why": <explanation>}, ...]};
+    each match object is returned as soon as it is complete in the stream.
+    """
+
+    MATCH_PATTERN = re.compile(r'\{\s*"i"\s*:\s*(\d+)\s*,\s*"why"\s*:\s*("(?:[^"\\]|\\.)*")\s*\}')
+
+    def __init__(self, search_results):
+        self.search_results = search_results
+        self.buffer = ""
+        self.position = 0
+        self.seen = set()
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        for match in self.MATCH_PATTERN.finditer(self.buffer, self.position):
+            self.position = match.end()
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(self.search_results) and index not in self.seen:
+                self.seen.add(index)
+                completed.append((self.search_results[index], json.loads(match.group(2))))
+        return completed
+
+    def close(self):
+        return []
+
+
+RANKING_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ranking",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "matches": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"i": {"type": "integer"}, "why": {"type": "string"}},
+                        "required": ["i", "why"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["matches"],
+            "additionalProperties": False,
+        },
+    },
+}
+
 
 class LLMHandler:
-    def __init__(self, model):
+    def __init__(self, model, async_client=None, prompt_builder=None, structured_output=True):
         self.model = model
+        self.chat_model = "gpt-4o-mini"
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self._async_client = async_client
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.structured_output = structured_output
 
-    def find_best_match(self, query, search_results):
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = create_async_openai_client()
+        return self._async_client
+
+    def _best_match_messages(self, query, candidates):
         prompt = f"""Query: {query}
 
 Search Results:
-{self._format_results(search_results)}
+{self._format_results(candidates)}
 
 Based on the query and the search results, which result is the best match? 
 Return your response in the following format:
 Best match: [index of the best match (1-based)]
 Brief explanation: [A short explanation of why this is the best match]"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant designed to find the best match for a given query among search results."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        content = response.choices[0].message.content
-        return self._parse_response(content, search_results)
+        return [
+            {"role": "system", "content": "You are a helpful assistant designed to find the best match for a given query among search results."},
+            {"role": "user", "content": prompt}
+        ]
 
-    def find_best_matches(self, query, search_results, num_matches=5):
+    def _best_matches_messages(self, query, candidates, num_matches):
         prompt = f"""Query: {query}
 
 Search Results:
-{self._format_results(search_results)}
+{self._format_results(candidates)}
 
 Based on the query and the search results, rank the top {num_matches} best matches. 
 Return your response in the following format:
@@ -47,51 +162,134 @@ Return your response in the following format:
 5. [index of the fifth best match (1-based)]
    Explanation: [A short explanation of why this is a good match]"""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant designed to find the best matches for a given query among search results."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        return [
+            {"role": "system", "content": "You are a helpful assistant designed to find the best matches for a given query among search results."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _structured_messages(self, query, candidates, num_matches):
+        prompt = f"""Query: {query}
+
+Results:
+{self._format_results(candidates)}
+
+Rank the {num_matches} results that best match the query, best first. For each give its number as "i" and a reason of at most 15 words as "why"."""
+
+        return [
+            {"role": "system", "content": "You rank transcript excerpts by how well they match a search query."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _request(self, query, search_results, num_matches, single=False):
+        """Build the chat completion arguments and the candidates the reply refers to."""
+        candidates = self.prompt_builder.build(query, search_results)
+        if self.structured_output:
+            kwargs = {
+                "messages": self._structured_messages(query, candidates, num_matches),
+                "response_format": RANKING_SCHEMA,
+                # Each match takes ~30 tokens; a reply cut short loses whole matches
+                "max_tokens": 64 + 64 * num_matches,
+            }
+        elif single:
+            kwargs = {"messages": self._best_match_messages(query, candidates)}
+        else:
+            kwargs = {"messages": self._best_matches_messages(query, candidates, num_matches)}
+        return kwargs, [result for result, _ in candidates]
+
+    def find_best_match(self, query, search_results):
+        kwargs, candidates = self._request(query, search_results, 1, single=True)
+        response = self.client.chat.completions.create(model=self.chat_model, **kwargs)
+
+        content = response.choices[0].message.content
+        return self._parse_response(content, candidates) or (None, None, "No clear best match found.")
+
+    async def find_best_match_async(self, query, search_results):
+        kwargs, candidates = self._request(query, search_results, 1, single=True)
+        response = await self.async_client.chat.completions.create(model=self.chat_model, **kwargs)
+
+        content = response.choices[0].message.content
+        return self._parse_response(content, candidates)
+
+    def find_best_matches(self, query, search_results, num_matches=5):
+        kwargs, candidates = self._request(query, search_results, num_matches)
+        response = self.client.chat.completions.create(model=self.chat_model, **kwargs)
+
+        content = response.choices[0].message.content
+        return self._parse_multiple_responses(content, candidates, num_matches)
+
+    async def find_best_matches_async(self, query, search_results, num_matches=5):
+        kwargs, candidates = self._request(query, search_results, num_matches)
+        response = await self.async_client.chat.completions.create(model=self.chat_model, **kwargs)
 
         content = response.choices[0].message.content
-        return self._parse_multiple_responses(content, search_results, num_matches)
+        return self._parse_multiple_responses(content, candidates, num_matches)
+
+    def _format_results(self, candidates):
+        return "\n\n".join([f"{i+1}. {snippet}" for i, (_, snippet) in enumerate(candidates)])
 
-    def _format_results(self, search_results):
-        return "\n\n".join([f"{i+1}. {result['text']}" for i, result in enumerate(search_results)])
+    def _parse_structured(self, content, search_results, num_matches):
+        try:
+            matches = json.loads(content)["matches"]
+        except json.JSONDecodeError:
+            # A reply truncated by max_tokens still holds its complete match objects
+            return RankedJsonParser(search_results).feed(content)[:num_matches] or None
+        except (KeyError, TypeError):
+            return None
+        parsed = []
+        seen = set()
+        for match in matches:
+            index = match.get("i") if isinstance(match, dict) else None
+            if isinstance(index, int) and 1 <= index <= len(search_results) and index not in seen:
+                seen.add(index)
+                parsed.append((search_results[index - 1], str(match.get("why", "")).strip()))
+        return parsed[:num_matches]
 
     def _parse_multiple_responses(self, content, search_results, num_matches):
-        lines = content.split('\n')
-        best_matches = []
-        current_match = None
-        current_explanation = ""
+        structured = self._parse_structured(content, search_results, num_matches)
+        if structured is not None:
+            return structured
+        parser = RankedMatchParser(search_results, num_matches)
+        return parser.feed(content) + parser.close()
 
-        for line in lines:
-            line = line.strip()
-            if line.startswith(tuple(str(i) + '.' for i in range(1, num_matches + 1))):
-                if current_match is not None:
-                    best_matches.append((current_match, current_explanation.strip()))
-                index = int(line.split('.')[1].strip()) - 1
-                if 0 <= index < len(search_results):
-                    current_match = search_results[index]
-                    current_explanation = ""
-            elif line.startswith("Explanation:"):
-                current_explanation += line.split(':', 1)[1].strip() + " "
-
-        if current_match is not None:
-            best_matches.append((current_match, current_explanation.strip()))
-
-        return best_matches
-    
+    async def stream_best_matches(self, query, search_results, num_matches=5):
+        kwargs, candidates = self._request(query, search_results, num_matches)
+        stream = await self.async_client.chat.completions.create(model=self.chat_model, stream=True, **kwargs)
+
+        if self.structured_output:
+            parser = RankedJsonParser(candidates)
+        else:
+            parser = RankedMatchParser(candidates, num_matches)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                for match in parser.feed(chunk.choices[0].delta.content):
+                    yield match
+        for match in parser.close():
+            yield match
 
     def _parse_response(self, content, search_results):
-        lines = content.split('\n')
-        best_match_index = next((int(line.split(':')[1].strip()) for line in lines if line.startswith('Best match:')), None)
-        explanation = next((line.split(':')[1].strip() for line in lines if line.startswith('Brief explanation:')), "No explanation provided.")
+        structured = self._parse_structured(content, search_results, 1)
+        if structured:
+            best_match, explanation = structured[0]
+            return best_match['metadata']['id'], best_match['metadata'].get('start_time', '0'), explanation, best_match["metadata"]["text"]
+
+        lines = [line.strip() for line in content.split('\n')]
+        # The index may come back decorated, e.g. "Best match: [1]"
+        index_matches = (re.search(r"\d+", line.split(':', 1)[1]) for line in lines if line.startswith('Best match:'))
+        best_match_index = next((int(index_match.group()) for index_match in index_matches if index_match), None)
+        explanation = None
+        for line in lines:
+            if line.startswith('Best match:') and explanation is not None:
+                break
+            if line.startswith('Brief explanation:'):
+                explanation = [line.split(':', 1)[1].strip()]
+            elif line and explanation is not None:
+                # The explanation continues until the next header
+                explanation.append(line)
+        explanation = " ".join(explanation) if explanation else "No explanation provided."
 
         if best_match_index and 1 <= best_match_index <= len(search_results):
             best_match = search_results[best_match_index - 1]
             return best_match['metadata']['id'], best_match['metadata'].get('start_time', '0'), explanation, best_match["metadata"]["text"]
-        
-        return None, None, "No clear best match found."
\ No newline at end of file
+
+        # No usable match; callers fall back to vector order
+        return None
\ No newline at end of file
@@ -0,0 +1,342 @@
+import os
+import json
+import mmap
+import logging
+import asyncio
+import argparse
+import numpy as np
+from .embedding import shorten_embedding
+from .filters import FieldIndex
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+METADATA_FILE = "metadata.jsonl"
+OFFSETS_FILE = "offsets.npy"
+FIELDS_FILE = "fields.json"
+IDS_FILE = "ids.json"
+
+
+def top_k(scores, n_results):
+    """Positions of the `n_results` highest scores, best first."""
+    k = min(n_results, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def quantize(vectors, dtype):
+    """Normalize rows for cosine scoring and quantize them to float16 or int8.
+
+    Returns the quantized matrix and, for int8, the per-row scale factors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported local index dtype: {dtype}")
+
+
+class MetadataWriter:
+    """Writes the compact metadata sidecar shared by the local indexes.
+
+    Rows are stored one JSON array per line, aligned to a shared field list,
+    with byte offsets so single rows can be read lazily.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fields = []
+        self.ids = []
+        self.count = 0
+        self._field_positions = {}
+        self._offsets = [0]
+        os.makedirs(path, exist_ok=True)
+        self._file = open(os.path.join(path, METADATA_FILE), "wb")
+
+    def add(self, id, metadata):
+        for key in metadata:
+            if key not in self._field_positions:
+                self._field_positions[key] = len(self.fields)
+                self.fields.append(key)
+        row = [None] * len(self.fields)
+        for key, value in metadata.items():
+            row[self._field_positions[key]] = value
+        line = json.dumps([id] + row, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+        self._file.write(line)
+        self._offsets.append(self._offsets[-1] + len(line))
+        self.ids.append(id)
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+        np.save(os.path.join(self.path, OFFSETS_FILE), np.array(self._offsets, dtype=np.int64))
+        with open(os.path.join(self.path, FIELDS_FILE), "w") as f:
+            json.dump(self.fields, f)
+        with open(os.path.join(self.path, IDS_FILE), "w") as f:
+            json.dump(self.ids, f)
+
+
+class MetadataReader:
+    def __init__(self, path):
+        self.path = path
+        self._positions = None
+        with open(os.path.join(path, FIELDS_FILE)) as f:
+            self.fields = json.load(f)
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        self.count = len(self.offsets) - 1
+        with open(os.path.join(path, METADATA_FILE), "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def row(self, position):
+        line = self._data[self.offsets[position]:self.offsets[position + 1]]
+        id, *values = json.loads(line)
+        return id, {field: value for field, value in zip(self.fields, values) if value is not None}
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield self.row(position)
+
+    def position(self, id):
+        if self._positions is None:
+            with open(os.path.join(self.path, IDS_FILE)) as f:
+                self._positions = {id: position for position, id in enumerate(json.load(f))}
+        return self._positions.get(id)
+
+
+class LocalIndexWriter:
+    """Writes a local index directory: a quantized vector matrix plus a metadata sidecar.
+
+    With `append=True` the rows of an index already at `path` are kept, and
+    adding one of their IDs again is a no-op, so incremental runs that only
+    see new vectors add to the index instead of replacing it.
+    """
+
+    def __init__(self, path, dtype="float16", append=False):
+        self.path = path
+        self.dtype = dtype
+        self.count = 0
+        self._pending = []
+        self._chunks = []
+        self._scales = []
+        self._existing = set()
+        existing = self._load_existing() if append and os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+        self._metadata = MetadataWriter(path)
+        if existing is not None:
+            rows, vectors, scales = existing
+            for id, metadata in rows:
+                self._metadata.add(id, metadata)
+                self._existing.add(id)
+            self._chunks.append(vectors)
+            if scales is not None:
+                self._scales.append(scales)
+            self.count = len(rows)
+
+    def _load_existing(self):
+        # Read fully into memory, since close() rewrites these files
+        with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if not manifest["count"]:
+            return None
+        vectors = np.load(os.path.join(self.path, VECTORS_FILE))
+        scales = np.load(os.path.join(self.path, SCALES_FILE)) if manifest["dtype"] == "int8" else None
+        if manifest["dtype"] != self.dtype:
+            vectors = vectors.astype(np.float32)
+            vectors, scales = quantize(vectors * scales[:, None] if scales is not None else vectors, self.dtype)
+        reader = MetadataReader(self.path)
+        try:
+            rows = list(reader)
+        finally:
+            reader.close()
+        logger.info(f"Keeping {len(rows)} vectors of the existing local index at {self.path}")
+        return rows, vectors, scales
+
+    def add(self, id, values, metadata):
+        if id in self._existing:
+            return
+        self._metadata.add(id, metadata)
+        self._pending.append(values)
+        self.count += 1
+        if len(self._pending) >= 4096:
+            self._flush_vectors()
+
+    def _flush_vectors(self):
+        if not self._pending:
+            return
+        quantized, scales = quantize(self._pending, self.dtype)
+        self._chunks.append(quantized)
+        if scales is not None:
+            self._scales.append(scales)
+        self._pending = []
+
+    def close(self):
+        self._flush_vectors()
+        self._metadata.close()
+        dim = self._chunks[0].shape[1] if self._chunks else 0
+        vectors = np.concatenate(self._chunks) if self._chunks else np.empty((0, dim), dtype=self.dtype)
+        np.save(os.path.join(self.path, VECTORS_FILE), vectors)
+        if self.dtype == "int8":
+            scales = np.concatenate(self._scales) if self._scales else np.empty(0, dtype=np.float32)
+            np.save(os.path.join(self.path, SCALES_FILE), scales)
+        with open(os.path.join(self.path, MANIFEST_FILE), "w") as f:
+            json.dump({"dtype": self.dtype, "dim": dim, "count": self.count, "metric": "cosine"}, f)
+        logger.info(f"Wrote {self.count} vectors to local index at {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalVectorIndex:
+    """In-process replacement for PineconeSearch backed by a memory-mapped matrix."""
+
+    def __init__(self, path, block_size=65536):
+        self.path = path
+        self.block_size = block_size
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.count = len(self.vectors)
+        scales_path = os.path.join(path, SCALES_FILE)
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        self.metadata = MetadataReader(path)
+        self.field_index = FieldIndex(self.metadata)
+
+    def scores(self, query_embedding, positions=None):
+        """Cosine scores for every row, or only for the rows at `positions`."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        count = self.count if positions is None else len(positions)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.block_size):
+            rows = self.vectors[start:start + self.block_size] if positions is None else self.vectors[positions[start:start + self.block_size]]
+            block = np.asarray(rows, dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales if positions is None else self.scales[positions]
+        return scores
+
+    def row(self, position):
+        return self.metadata.row(position)
+
+    def vectors_for(self, ids):
+        """Return (found ids, normalized float32 vectors) for the ids stored in this index."""
+        positions = [(id, self.metadata.position(id)) for id in ids]
+        positions = [(id, position) for id, position in positions if position is not None]
+        rows = np.array([position for _, position in positions], dtype=np.int64)
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None]
+        return [id for id, _ in positions], vectors
+
+    def values(self, position):
+        vector = np.asarray(self.vectors[position], dtype=np.float32)
+        return (vector * self.scales[position] if self.scales is not None else vector).tolist()
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        # With a filter only the matching rows are read and scored
+        positions = np.flatnonzero(self.field_index.mask(filter)) if filter else None
+        scores = self.scores(query_embedding, positions)
+        results = []
+        for i in top_k(scores, n_results):
+            position = i if positions is None else positions[i]
+            id, metadata = self.row(position)
+            results.append({
+                "id": id,
+                "score": float(scores[i]),
+                "metadata": metadata,
+                "text": metadata.get('text', '')
+            })
+            if include_values:
+                results[-1]["values"] = self.values(position)
+        return results
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        return await asyncio.to_thread(self.find_nearest, query_embedding, n_results, include_values=include_values, filter=filter)
+
+
+class RescoringSearch:
+    """Two-stage search: coarse retrieval on short vectors, exact rescoring on full ones.
+
+    The query embedding is requested at full size. Its first `dimensions`
+    components, re-normalized, query the coarse backend for `candidates`
+    results, which are then rescored against full-dimension vectors held in
+    a local index. Candidates missing from the local index keep their coarse
+    score and rank after the rescored ones.
+    """
+
+    def __init__(self, coarse, full_index, dimensions, candidates=50):
+        self.coarse = coarse
+        self.full_index = full_index
+        self.dimensions = dimensions
+        self.candidates = candidates
+
+    def rescore(self, query_embedding, results, n_results):
+        ids, vectors = self.full_index.vectors_for([result['id'] for result in results])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = dict(zip(ids, (vectors @ (query / (np.linalg.norm(query) or 1))).tolist())) if ids else {}
+        rescored = [{**result, "coarse_score": result['score'], "score": scores[result['id']]} for result in results if result['id'] in scores]
+        rescored.sort(key=lambda result: result['score'], reverse=True)
+        return (rescored + [result for result in results if result['id'] not in scores])[:n_results]
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        # Values, when requested, are the coarse (shortened) vectors
+        results = self.coarse.find_nearest(shorten_embedding(query_embedding, self.dimensions), max(n_results, self.candidates), query_text=query_text, include_values=include_values, filter=filter)
+        return self.rescore(query_embedding, results, n_results)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        results = await self.coarse.find_nearest_async(shorten_embedding(query_embedding, self.dimensions), max(n_results, self.candidates), query_text=query_text, include_values=include_values, filter=filter)
+        return await asyncio.to_thread(self.rescore, query_embedding, results, n_results)
+
+    @property
+    def async_index(self):
+        return getattr(self.coarse, "async_index", None)
+
+
+def export_pinecone_index(index, path, dtype="float16", batch_size=100, namespace=None):
+    kwargs = {"namespace": namespace} if namespace else {}
+    with LocalIndexWriter(path, dtype=dtype) as writer:
+        for ids in index.list(**kwargs):
+            for start in range(0, len(ids), batch_size):
+                response = index.fetch(ids=ids[start:start + batch_size], **kwargs)
+                for id, vector in response.vectors.items():
+                    writer.add(id, vector.values, vector.metadata or {})
+            logger.info(f"Exported {writer.count} vectors")
+    return writer.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage local vector indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export a Pinecone index to a local index directory")
+    export_parser.add_argument("--index", required=True, help="Pinecone index name")
+    export_parser.add_argument("--out", required=True, help="Output directory")
+    export_parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    export_parser.add_argument("--namespace", default=None)
+    args = parser.parse_args(argv)
+
+    from pinecone import Pinecone
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(args.index)
+    count = export_pinecone_index(index, args.out, dtype=args.dtype, namespace=args.namespace)
+    print(f"Exported {count} vectors from {args.index} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
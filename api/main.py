@@ -1,62 +1,193 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse, RedirectResponse
 from fastapi.security import APIKeyHeader
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
 import os
+import time
+import json
+import asyncio
 import logging
 from .embedding import EmbeddingGenerator
 from .llm import LLMHandler
+from .prompt import PromptBuilder
 from .search import PineconeSearch
+from .local_index import LocalVectorIndex, RescoringSearch
+from .bm25 import BM25Index, HybridSearch
+from .diversify import DiversifiedSearch
+from .hydrate import MetadataStore, HydratedSearch
+from .transcripts import TranscriptStore
+from .shards import ShardedSearch, parse_shards, track_missing_shards
+from .filters import build_filter, filter_key
+from .responses import FastJSONResponse, CompressedJSONResponse, conditional_response
+from .cache import EmbeddingCache, ResponseCache, SemanticCache, normalize_text
+from .clients import create_async_openai_client, create_async_pinecone_index, LazyIndex, warm_up
+from .lazy import COLD_START_MODE, load_environment
+from .rerank import RerankPolicy, DEADLINE_EXCEEDED, OVERLOADED, NO_RANKING, complete_matches, vector_order_match, vector_order_matches
+from .upstream import UpstreamLimiter, Overloaded, HedgedSearch, call_upstream
+from .metrics import (registry, track_stage, track_init, record_cache_stats, request_id_var, new_request_id,
+                      install_request_id_logging, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT)
 
-load_dotenv()
+load_environment()
 
 # Global variables
 embedding_generator = None
 pinecone_search = None
 llm_handler = None
+embedding_cache = None
+async_openai_client = None
+transcript_store = None
+# Clients of shard indexes other than the default one, by index name
+shard_indexes = {}
 youtube_url_watch = "https://www.youtube.com/watch?v"
 
 # Logging setup
-logging.basicConfig(level=logging.INFO)
+install_request_id_logging()
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(request_id)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 API_KEY_HASH = os.getenv("API_KEY_HASH")
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "8"))
+
+response_cache = ResponseCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+)
+
+def optional_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+# Bump after re-indexing so results cached for the old index are never served
+INDEX_VERSION = os.getenv("INDEX_VERSION", "")
+
+# Paraphrased queries reuse results when their embeddings are this similar; unset disables it
+semantic_cache = SemanticCache(
+    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "1024")),
+    threshold=optional_float("SEMANTIC_CACHE_THRESHOLD"),
+    ttl=optional_float("SEMANTIC_CACHE_TTL") or 3600,
+) if optional_float("SEMANTIC_CACHE_THRESHOLD") else None
+
+rerank_policy = RerankPolicy(
+    score_threshold=optional_float("RERANK_SCORE_THRESHOLD"),
+    margin_threshold=optional_float("RERANK_MARGIN_THRESHOLD"),
+    deadline=optional_float("RERANK_DEADLINE"),
+)
+
+# Per-upstream concurrency limits; calls beyond a full wait queue are shed with 503
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "256"))
+UPSTREAM_QUEUE_TIMEOUT = optional_float("UPSTREAM_QUEUE_TIMEOUT")
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3"))
+embedding_limiter = UpstreamLimiter("openai_embeddings", int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "64")), UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT)
+chat_limiter = UpstreamLimiter("openai_chat", int(os.getenv("OPENAI_CHAT_CONCURRENCY", "32")), UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT)
+pinecone_limiter = UpstreamLimiter("pinecone", int(os.getenv("PINECONE_CONCURRENCY", "64")), UPSTREAM_QUEUE_SIZE, UPSTREAM_QUEUE_TIMEOUT)
+
+# GET search responses are cached privately unless SEARCH_CACHE_CONTROL opts in to the CDN,
+# and vary on the API key; search_multiple bodies from this size on are compressed
+SEARCH_CACHE_CONTROL = os.getenv("SEARCH_CACHE_CONTROL", "private, max-age=60")
+SEARCH_VARY = ("X-API-Key",)
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+def limited(limiter, func, *args, **kwargs):
+    return call_upstream(limiter, func, *args, max_attempts=UPSTREAM_RETRY_ATTEMPTS, **kwargs)
 
 api_key_header = APIKeyHeader(name="X-API-Key")
 
-class Query(BaseModel):
+class SearchFilters(BaseModel):
+    channel_id: Optional[str] = None
+    video_id: Optional[str] = None
+    author: Optional[str] = None
+    published_after: Optional[date] = None
+    published_before: Optional[date] = None
+
+    def to_filter(self):
+        return build_filter(self.channel_id, self.video_id, self.author, self.published_after, self.published_before)
+
+    def filter_params(self):
+        params = {}
+        for name in ("channel_id", "video_id", "author", "published_after", "published_before"):
+            value = getattr(self, name)
+            if value is not None:
+                params[name] = str(value)
+        return params
+
+class Query(SearchFilters):
     text: str
+    # Return this many seconds of transcript before and after each match
+    context_seconds: Optional[float] = Field(None, gt=0, le=600)
+
+class BatchQuery(SearchFilters):
+    queries: List[str]
+    rerank: bool = False
+    n_results: int = 10
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the clients and open upstream connections before serving, so the
+    # first request does not pay for client setup and TLS handshakes.
+    # In cold-start mode clients are built by the first request that needs them instead,
+    # so static pages on a fresh container never import the SDKs.
+    if os.getenv("WARM_UP_ON_STARTUP", "false" if COLD_START_MODE else "true").lower() == "true":
+        try:
+            embedding_generator, pinecone_search, _ = initialize_components()
+            await warm_up(async_openai_client, getattr(pinecone_search, "async_index", None), embedding_generator.model_name)
+        except Exception as e:
+            logger.warning(f"Startup warm-up failed, components will be initialized on first request: {str(e)}")
+    yield
+    await close_components()
 
 app = FastAPI(
     title="YouTube Search API",
     description="API for finding best matches in YouTube transcripts using Pinecone",
     version="1.0.0",
     openapi_tags=[{"name": "search", "description": "Search operations"}],
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 @app.middleware("http")
 async def add_security_headers_and_log_requests(request: Request, call_next):
-    # Log request details
-    start_time = time.time()
-    logging.info(f"Request received: {request.method} {request.url}")
-    logging.info(f"Client IP: {request.client.host}")
+    # Tag everything logged while serving this request with its ID
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    token = request_id_var.set(request_id)
+    HTTP_IN_FLIGHT.inc()
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        # Log request details
+        logging.info(f"Request received: {request.method} {request.url}")
+        logging.info(f"Client IP: {request.client.host}")
 
-    # Process the request
-    response = await call_next(request)
+        # Process the request
+        response = await call_next(request)
+        status = response.status_code
 
-    # Add security headers
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        # Add security headers
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["X-Request-ID"] = request_id
 
-    # Log response details
-    process_time = time.time() - start_time
-    logging.info(f"Response status: {response.status_code}")
-    logging.info(f"Process time: {process_time:.2f} seconds")
+        # Log response details
+        process_time = time.perf_counter() - start_time
+        logging.info(f"Response status: {response.status_code}")
+        logging.info(f"Process time: {process_time:.2f} seconds")
 
-    return response
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start_time, method=request.method, route=getattr(route, "path", "unmatched"), status=status)
+        HTTP_IN_FLIGHT.dec()
+        request_id_var.reset(token)
 
 def verify_api_key(api_key: str = Depends(api_key_header)) -> str:
     import hashlib
@@ -66,16 +197,129 @@ def verify_api_key(api_key: str = Depends(api_key_header)) -> str:
         raise HTTPException(status_code=403, detail="Could not validate API key")
     return api_key
 
+# Per-index retrieval settings. `dimensions` is the size of the vectors stored in
+# the index (None for the model's full 3072); `rescore_index_path` points to a
+# local index of full-size vectors used to rescore the top `rescore_candidates`.
+INDEX_SETTINGS = {
+    "johnniboi-text-embedding-3-large": {"dimensions": None, "rescore_index_path": None, "rescore_candidates": 50},
+}
+
+def index_settings(index_name):
+    settings = {"dimensions": None, "rescore_index_path": None, "rescore_candidates": 50}
+    settings.update(INDEX_SETTINGS.get(index_name, {}))
+    if os.getenv("EMBEDDING_DIMENSIONS"):
+        settings["dimensions"] = int(os.getenv("EMBEDDING_DIMENSIONS"))
+    if os.getenv("RESCORE_INDEX_PATH"):
+        settings["rescore_index_path"] = os.getenv("RESCORE_INDEX_PATH")
+    if os.getenv("RESCORE_CANDIDATES"):
+        settings["rescore_candidates"] = int(os.getenv("RESCORE_CANDIDATES"))
+    return settings
+
+def pinecone_backend(embedding_generator, index_name, namespace=None, include_metadata=True):
+    if index_name == embedding_generator.index_name:
+        index, async_index = embedding_generator.index, embedding_generator.async_index
+    else:
+        if index_name not in shard_indexes:
+            shard_indexes[index_name] = (LazyIndex(embedding_generator.pc, index_name), create_async_pinecone_index(embedding_generator.pc, index_name))
+        index, async_index = shard_indexes[index_name]
+    backend = PineconeSearch(index, async_index, include_metadata=include_metadata, namespace=namespace)
+    if os.getenv("PINECONE_HEDGE", "false").lower() == "true":
+        backend = HedgedSearch(
+            backend,
+            quantile=float(os.getenv("PINECONE_HEDGE_QUANTILE", "0.95")),
+            min_delay=float(os.getenv("PINECONE_HEDGE_MIN_DELAY", "0.02")),
+            limiter=pinecone_limiter,
+        )
+    return backend
+
 def initialize_components():
-    global embedding_generator, pinecone_search, llm_handler
+    global embedding_generator, pinecone_search, llm_handler, embedding_cache, async_openai_client, transcript_store
     if embedding_generator is None:
         model = "text-embedding-3-large"
-        pinecone_index_name = "johnniboi-text-embedding-3-large"
-        embedding_generator = EmbeddingGenerator(model, pinecone_index_name)
-        pinecone_search = PineconeSearch(embedding_generator.index)
-        llm_handler = LLMHandler(model)
+        pinecone_index_name = os.getenv("PINECONE_INDEX_NAME", "johnniboi-text-embedding-3-large")
+        settings = index_settings(pinecone_index_name)
+        embedding_cache = EmbeddingCache(
+            max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+            ttl=optional_float("EMBEDDING_CACHE_TTL"),
+            path=os.getenv("EMBEDDING_CACHE_PATH"),
+        )
+        with track_init("openai_client"):
+            async_openai_client = create_async_openai_client()
+        # With rescoring the query is embedded at full size and shortened locally for the coarse pass
+        query_dimensions = None if settings["rescore_index_path"] else settings["dimensions"]
+        with track_init("embedding_generator"):
+            embedding_generator = EmbeddingGenerator(
+                model,
+                pinecone_index_name,
+                cache=embedding_cache,
+                async_client=async_openai_client,
+                dimensions=query_dimensions,
+                batch_window=optional_float("EMBEDDING_BATCH_WINDOW"),
+                max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX", "16")),
+                host=os.getenv("PINECONE_HOST"),
+                batch_call=lambda func, texts: limited(embedding_limiter, func, texts),
+            )
+        with track_init("search_backend"):
+            if os.getenv("SEARCH_BACKEND", "pinecone") == "local":
+                pinecone_search = LocalVectorIndex(os.getenv("LOCAL_INDEX_PATH", "local_index"))
+            else:
+                # With a local metadata store, queries fetch only IDs and scores
+                metadata_store_path = os.getenv("METADATA_STORE_PATH")
+                shards = parse_shards(os.getenv("PINECONE_SHARDS", ""), pinecone_index_name)
+                if shards:
+                    pinecone_search = ShardedSearch(
+                        [(f"{index_name}:{namespace}" if namespace else index_name,
+                          pinecone_backend(embedding_generator, index_name, namespace, include_metadata=not metadata_store_path))
+                         for index_name, namespace in shards],
+                        timeout=float(os.getenv("PINECONE_SHARD_TIMEOUT", "1.0")),
+                    )
+                else:
+                    pinecone_search = pinecone_backend(embedding_generator, pinecone_index_name, include_metadata=not metadata_store_path)
+                if metadata_store_path:
+                    pinecone_search = HydratedSearch(pinecone_search, MetadataStore(metadata_store_path))
+            if settings["rescore_index_path"] and settings["dimensions"]:
+                pinecone_search = RescoringSearch(
+                    pinecone_search,
+                    LocalVectorIndex(settings["rescore_index_path"]),
+                    settings["dimensions"],
+                    candidates=settings["rescore_candidates"],
+                )
+            if os.getenv("HYBRID_SEARCH", "false").lower() == "true":
+                pinecone_search = HybridSearch(pinecone_search, BM25Index(os.getenv("BM25_INDEX_PATH", "bm25_index")))
+            if os.getenv("DIVERSIFY_RESULTS", "false").lower() == "true":
+                pinecone_search = DiversifiedSearch(
+                    pinecone_search,
+                    candidates=int(os.getenv("DIVERSIFY_CANDIDATES", "30")),
+                    lambda_mult=float(os.getenv("MMR_LAMBDA", "0.7")),
+                    max_gap=float(os.getenv("SEGMENT_MERGE_GAP", "30")),
+                )
+        if os.getenv("TRANSCRIPT_STORE_PATH"):
+            with track_init("transcript_store"):
+                transcript_store = TranscriptStore(os.getenv("TRANSCRIPT_STORE_PATH"))
+        prompt_builder = PromptBuilder(
+            token_budget=int(os.getenv("RERANK_TOKEN_BUDGET", "1500")),
+            max_candidate_tokens=int(os.getenv("RERANK_CANDIDATE_TOKENS", "200")),
+        )
+        with track_init("llm_handler"):
+            llm_handler = LLMHandler(
+                model,
+                async_client=async_openai_client,
+                prompt_builder=prompt_builder,
+                structured_output=os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true",
+            )
     return embedding_generator, pinecone_search, llm_handler
 
+async def close_components():
+    global embedding_generator, pinecone_search, llm_handler, async_openai_client
+    if async_openai_client is not None:
+        await async_openai_client.close()
+    for _, async_index in shard_indexes.values():
+        await async_index.close()
+    shard_indexes.clear()
+    if getattr(pinecone_search, "async_index", None) is not None:
+        await pinecone_search.async_index.close()
+    embedding_generator = pinecone_search = llm_handler = async_openai_client = None
+
 
 def process_search_result(video_id, timestamp, explanation, text):
     if video_id and timestamp:
@@ -94,25 +338,26 @@ def process_search_result(video_id, timestamp, explanation, text):
             "explanation": explanation
         }
 
-import time
-import asyncio
+
+def process_match(result, explanation):
+    video_id = result['metadata'].get('id')
+    timestamp = result['metadata'].get('start_time', '0')
+    text = result['metadata'].get('text', '')
+    seconds = int(float(timestamp))
+    return {
+        "video_id": video_id,
+        "timestamp": seconds,
+        "url_with_timestamp": f"{youtube_url_watch}={video_id}&t={seconds}s",
+        "text": text,
+        "score": result['score'],
+        "explanation": explanation
+    }
 
 def process_multiple_search_results(matched_results):
-    processed_results = []
-    for result, explanation in matched_results:
-        video_id = result['metadata'].get('id')
-        timestamp = result['metadata'].get('start_time', '0')
-        text = result['metadata'].get('text', '')
-        seconds = int(float(timestamp))
-        processed_results.append({
-            "video_id": video_id,
-            "timestamp": seconds,
-            "url_with_timestamp": f"{youtube_url_watch}={video_id}&t={seconds}s",
-            "text": text,
-            "score": result['score'],
-            "explanation": explanation
-        })
-    return {"results": processed_results}
+    return {"results": [process_match(result, explanation) for result, explanation in matched_results]}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @app.get("/version-check")
@@ -123,6 +368,32 @@ async def version_check():
         "formatted_time": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
     }
 
+@app.get("/cache-stats", dependencies=[Depends(verify_api_key)])
+async def cache_stats():
+    return {
+        "embedding": embedding_cache.stats() if embedding_cache is not None else None,
+        "response": response_cache.stats(),
+        "semantic": semantic_cache.stats() if semantic_cache is not None else None,
+    }
+
+@app.post("/cache/invalidate", dependencies=[Depends(verify_api_key)])
+async def invalidate_caches():
+    """Drop cached results, e.g. after the index was updated."""
+    response_cache.clear()
+    if semantic_cache is not None:
+        semantic_cache.invalidate()
+    return {"invalidated": True}
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_api_key)])
+async def metrics():
+    """Prometheus metrics in the text exposition format."""
+    if embedding_cache is not None:
+        record_cache_stats("embedding", embedding_cache.stats())
+    record_cache_stats("response", response_cache.stats())
+    if semantic_cache is not None:
+        record_cache_stats("semantic", semantic_cache.stats())
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     return """
@@ -156,52 +427,277 @@ async def root():
     </html>
     """
 
+def semantic_cache_namespace(endpoint, embedding_generator, llm_handler, filter=None):
+    return (endpoint, embedding_generator.index_name, embedding_generator.model_name, llm_handler.chat_model, INDEX_VERSION, filter_key(filter))
+
+def response_cache_key(endpoint, text, embedding_generator, llm_handler, filter=None):
+    return semantic_cache_namespace(endpoint, embedding_generator, llm_handler, filter) + (normalize_text(text),)
+
+def check_context_request(query):
+    if query.context_seconds is not None and transcript_store is None:
+        raise HTTPException(status_code=400, detail="context_seconds requires a transcript store (TRANSCRIPT_STORE_PATH)")
+
+def with_context(match, context_seconds):
+    # Cached results are shared, so context goes on a copy
+    if context_seconds is None or not match.get("video_id"):
+        return match
+    return {**match, "context": transcript_store.context(match["video_id"], match["timestamp"], context_seconds)}
+
+def rerank_flags(skip_reason):
+    return {"reranked": skip_reason is None, "rerank_skipped_reason": skip_reason}
+
+def partial_flags(missing_shards):
+    return {"partial": True, "missing_shards": sorted(missing_shards)} if missing_shards else {}
+
+def is_cacheable(result):
+    # Results that fell back to vector order because of the deadline, load
+    # shedding or an unusable LLM reply are not cached, so the next identical query gets another chance at a rerank.
+    # Neither are results missing a shard that was slow or down.
+    return result.get("rerank_skipped_reason") not in (DEADLINE_EXCEEDED, OVERLOADED, NO_RANKING) and not result.get("partial")
+
+async def embed_query(embedding_generator, text):
+    # Batched embeddings take an embedding_limiter slot per API call rather than per query
+    if embedding_generator.batcher is not None:
+        return await embedding_generator.generate_embedding_async(text)
+    return await limited(embedding_limiter, embedding_generator.generate_embedding_async, text)
+
+async def rerank_matches(llm_handler, text, search_results):
+    matches = await limited(chat_limiter, llm_handler.find_best_matches_async, text, search_results)
+    return complete_matches(matches, search_results) if matches else matches
+
+async def run_search(text, filter=None):
+    embedding_generator, pinecone_search, llm_handler = initialize_components()
+
+    with track_stage("search", "total"):
+        with track_stage("search", "embedding", upstream="openai"):
+            query_embedding = await embed_query(embedding_generator, text)
+
+        namespace = semantic_cache_namespace("search", embedding_generator, llm_handler, filter)
+        cached = semantic_cache.get(namespace, query_embedding) if semantic_cache is not None else None
+        if cached is not None:
+            logger.info("Serving results of a similar cached query")
+            return cached
+
+        missing_shards = track_missing_shards()
+        with track_stage("search", "retrieval", upstream="pinecone"):
+            search_results = await limited(pinecone_limiter, pinecone_search.find_nearest_async, query_embedding, query_text=text, filter=filter)
+
+        with track_stage("search", "rerank", upstream="openai"):
+            (video_id, timestamp, explanation, match_text), skip_reason = await rerank_policy.run(
+                search_results,
+                lambda: limited(chat_limiter, llm_handler.find_best_match_async, text, search_results),
+                lambda: vector_order_match(search_results),
+            )
+
+        result = process_search_result(video_id, timestamp, explanation, match_text)
+        result.update(rerank_flags(skip_reason))
+        result.update(partial_flags(missing_shards))
+        if semantic_cache is not None and is_cacheable(result):
+            semantic_cache.put(namespace, query_embedding, result)
+    return result
+
+async def run_search_multiple(text, filter=None):
+    embedding_generator, pinecone_search, llm_handler = initialize_components()
+
+    with track_stage("search_multiple", "total"):
+        with track_stage("search_multiple", "embedding", upstream="openai"):
+            query_embedding = await embed_query(embedding_generator, text)
+
+        namespace = semantic_cache_namespace("search_multiple", embedding_generator, llm_handler, filter)
+        cached = semantic_cache.get(namespace, query_embedding) if semantic_cache is not None else None
+        if cached is not None:
+            logger.info("Serving results of a similar cached query")
+            return cached
+
+        missing_shards = track_missing_shards()
+        with track_stage("search_multiple", "retrieval", upstream="pinecone"):
+            search_results = await limited(pinecone_limiter, pinecone_search.find_nearest_async, query_embedding, n_results=10, query_text=text, filter=filter)  # Fetch more results for LLM to choose from
+
+        with track_stage("search_multiple", "rerank", upstream="openai"):
+            best_matches, skip_reason = await rerank_policy.run(
+                search_results,
+                lambda: rerank_matches(llm_handler, text, search_results),
+                lambda: vector_order_matches(search_results),
+            )
+
+        results = process_multiple_search_results(best_matches)
+        results.update(rerank_flags(skip_reason))
+        results.update(partial_flags(missing_shards))
+        if semantic_cache is not None and is_cacheable(results):
+            semantic_cache.put(namespace, query_embedding, results)
+    return results
+
 @app.post("/search/", tags=["search"], dependencies=[Depends(verify_api_key)])
 async def search(query: Query):
     try:
-        start_time = time.time()
         embedding_generator, pinecone_search, llm_handler = initialize_components()
-        
-        logger.info(f"Starting embedding generation for query: {query.text}")
-        query_embedding = await asyncio.to_thread(embedding_generator.generate_embedding, query.text)
-        logger.info(f"Embedding generation completed in {time.time() - start_time:.2f} seconds")
-        
-        logger.info("Starting Pinecone search")
-        search_results = await asyncio.to_thread(pinecone_search.find_nearest, query_embedding)
-        logger.info(f"Pinecone search completed in {time.time() - start_time:.2f} seconds")
-        
-        logger.info("Starting LLM processing")
-        video_id, timestamp, explanation, text = await asyncio.to_thread(llm_handler.find_best_match, query.text, search_results)
-        logger.info(f"LLM processing completed in {time.time() - start_time:.2f} seconds")
-        
-        result = process_search_result(video_id, timestamp, explanation, text)
-        logger.info(f"Total processing time: {time.time() - start_time:.2f} seconds")
-        return result
+        check_context_request(query)
+        filter = query.to_filter()
+        key = response_cache_key("search", query.text, embedding_generator, llm_handler, filter)
+        result = await response_cache.get_or_compute(key, lambda: run_search(query.text, filter), should_cache=is_cacheable)
+        return with_context(result, query.context_seconds)
+    except (Overloaded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"An error occurred during search: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
     
-@app.post("/search_multiple/", tags=["search"], dependencies=[Depends(verify_api_key)])
-async def search_multiple(query: Query):
+async def search_multiple_results(query):
     try:
-        start_time = time.time()
         embedding_generator, pinecone_search, llm_handler = initialize_components()
-        
-        logger.info(f"Starting embedding generation for query: {query.text}")
-        query_embedding = await asyncio.to_thread(embedding_generator.generate_embedding, query.text)
-        logger.info(f"Embedding generation completed in {time.time() - start_time:.2f} seconds")
-        
-        logger.info("Starting Pinecone search")
-        search_results = await asyncio.to_thread(pinecone_search.find_nearest, query_embedding, n_results=10)  # Fetch more results for LLM to choose from
-        logger.info(f"Pinecone search completed in {time.time() - start_time:.2f} seconds")
-        
-        logger.info("Starting LLM processing")
-        best_matches = await asyncio.to_thread(llm_handler.find_best_matches, query.text, search_results)
-        logger.info(f"LLM processing completed in {time.time() - start_time:.2f} seconds")
-        
-        results = process_multiple_search_results(best_matches)
-        logger.info(f"Total processing time: {time.time() - start_time:.2f} seconds")
-        return results
+        check_context_request(query)
+        filter = query.to_filter()
+        key = response_cache_key("search_multiple", query.text, embedding_generator, llm_handler, filter)
+        results = await response_cache.get_or_compute(key, lambda: run_search_multiple(query.text, filter), should_cache=is_cacheable)
+        if query.context_seconds is None:
+            return results
+        return {**results, "results": [with_context(match, query.context_seconds) for match in results["results"]]}
+    except (Overloaded, HTTPException):
+        raise
     except Exception as e:
         logger.error(f"An error occurred during multiple search: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+def compressed(request, content):
+    # Matches carry long transcript texts, so these payloads are worth compressing
+    return CompressedJSONResponse(content, request.headers.get("accept-encoding"), min_size=COMPRESS_MIN_SIZE)
+
+@app.post("/search_multiple/", tags=["search"], dependencies=[Depends(verify_api_key)])
+async def search_multiple(query: Query, request: Request):
+    return compressed(request, await search_multiple_results(query))
+
+def canonical_redirect(request, query):
+    # Equivalent queries share one URL, and so one CDN cache entry
+    params = {"text": normalize_text(query.text), **query.filter_params()}
+    if query.context_seconds is not None:
+        params["context_seconds"] = str(query.context_seconds)
+    canonical = urlencode(sorted(params.items()))
+    if request.url.query != canonical:
+        return RedirectResponse(f"{request.url.path}?{canonical}", status_code=308, headers={"Cache-Control": SEARCH_CACHE_CONTROL, "Vary": ", ".join(SEARCH_VARY)})
+    return None
+
+def cache_control(result):
+    return SEARCH_CACHE_CONTROL if is_cacheable(result) else "no-store"
+
+@app.get("/search", tags=["search"], dependencies=[Depends(verify_api_key)])
+async def search_get(request: Request, query: Query = Depends()):
+    """CDN-cacheable GET variant of /search/.
+
+    Query strings are redirected to a canonical form, and responses carry an
+    ETag so repeated requests can be answered with 304 Not Modified.
+    """
+    redirect = canonical_redirect(request, query)
+    if redirect is not None:
+        return redirect
+    result = await search(query)
+    return conditional_response(request, FastJSONResponse(result), cache_control(result), vary=SEARCH_VARY)
+
+@app.get("/search_multiple", tags=["search"], dependencies=[Depends(verify_api_key)])
+async def search_multiple_get(request: Request, query: Query = Depends()):
+    """CDN-cacheable GET variant of /search_multiple/."""
+    redirect = canonical_redirect(request, query)
+    if redirect is not None:
+        return redirect
+    results = await search_multiple_results(query)
+    return conditional_response(request, compressed(request, results), cache_control(results), vary=SEARCH_VARY)
+
+def cached_events(cached, context_seconds=None):
+    for rank, match in enumerate(cached["results"], 1):
+        yield sse_event("match", {"rank": rank, **with_context(match, context_seconds)})
+    yield sse_event("done", {"count": len(cached["results"]), "reranked": cached.get("reranked", True)})
+
+@app.post("/search_multiple/stream", tags=["search"], dependencies=[Depends(verify_api_key)])
+async def search_multiple_stream(query: Query):
+    """Server-sent events variant of /search_multiple/.
+
+    Emits a `hits` event with the raw vector search results, then one `match`
+    event per ranked match as the LLM streams it, and finally `done`.
+    """
+    try:
+        embedding_generator, pinecone_search, llm_handler = initialize_components()
+    except Exception as e:
+        logger.error(f"An error occurred during streaming search: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    check_context_request(query)
+    filter = query.to_filter()
+    key = response_cache_key("search_multiple", query.text, embedding_generator, llm_handler, filter)
+
+    async def events():
+        try:
+            cached = response_cache.get(key)
+            if cached is not None:
+                for event in cached_events(cached, query.context_seconds):
+                    yield event
+                return
+
+            with track_stage("search_multiple_stream", "embedding", upstream="openai"):
+                query_embedding = await embed_query(embedding_generator, query.text)
+            namespace = semantic_cache_namespace("search_multiple", embedding_generator, llm_handler, filter)
+            cached = semantic_cache.get(namespace, query_embedding) if semantic_cache is not None else None
+            if cached is not None:
+                for event in cached_events(cached, query.context_seconds):
+                    yield event
+                return
+            missing_shards = track_missing_shards()
+            with track_stage("search_multiple_stream", "retrieval", upstream="pinecone"):
+                search_results = await limited(pinecone_limiter, pinecone_search.find_nearest_async, query_embedding, n_results=10, query_text=query.text, filter=filter)
+            yield sse_event("hits", {"results": [process_match(result, None) for result in search_results]})
+
+            ranked = rerank_policy.stream(search_results, lambda: llm_handler.stream_best_matches(query.text, search_results), chat_limiter.slot)
+            matches = []
+            with track_stage("search_multiple_stream", "rerank", upstream="openai"):
+                async for result, explanation in ranked:
+                    matches.append(process_match(result, explanation))
+                    yield sse_event("match", {"rank": len(matches), **with_context(matches[-1], query.context_seconds)})
+            flags = {**rerank_flags(ranked.skip_reason), **partial_flags(missing_shards)}
+            if is_cacheable(flags):
+                response_cache.put(key, {"results": matches, **flags})
+                if semantic_cache is not None:
+                    semantic_cache.put(namespace, query_embedding, {"results": matches, **flags})
+            yield sse_event("done", {"count": len(matches), **flags})
+        except Overloaded as e:
+            logger.warning(f"Streaming search shed: {str(e)}")
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"An error occurred during streaming search: {str(e)}", exc_info=True)
+            yield sse_event("error", {"detail": f"An error occurred: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/search_batch/", tags=["search"], dependencies=[Depends(verify_api_key)])
+async def search_batch(batch: BatchQuery):
+    if not batch.queries or len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch must contain between 1 and {MAX_BATCH_QUERIES} queries")
+    try:
+        embedding_generator, pinecone_search, llm_handler = initialize_components()
+        logger.info(f"Starting batch search for {len(batch.queries)} queries")
+
+        with track_stage("search_batch", "embedding", upstream="openai"):
+            query_embeddings = await limited(embedding_limiter, embedding_generator.generate_embeddings_async, batch.queries)
+
+        semaphore = asyncio.Semaphore(SEARCH_BATCH_CONCURRENCY)
+        filter = batch.to_filter()
+
+        async def run_query(text, query_embedding):
+            async with semaphore:
+                missing_shards = track_missing_shards()
+                with track_stage("search_batch", "retrieval", upstream="pinecone"):
+                    search_results = await limited(pinecone_limiter, pinecone_search.find_nearest_async, query_embedding, n_results=batch.n_results, query_text=text, filter=filter)
+                if batch.rerank:
+                    matches, skip_reason = await rerank_policy.run(
+                        search_results,
+                        lambda: rerank_matches(llm_handler, text, search_results),
+                        lambda: vector_order_matches(search_results),
+                    )
+                    return {"query": text, **process_multiple_search_results(matches), **rerank_flags(skip_reason), **partial_flags(missing_shards)}
+                matches = [(result, None) for result in search_results]
+            return {"query": text, **process_multiple_search_results(matches), **partial_flags(missing_shards)}
+
+        with track_stage("search_batch", "queries"):
+            results = await asyncio.gather(*(run_query(text, query_embedding) for text, query_embedding in zip(batch.queries, query_embeddings)))
+        return {"results": results}
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"An error occurred during batch search: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def render(self):
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def count(self, **labels):
+        return self._values.get(self._key(labels), (None, 0.0, 0))[2]
+
+    def render(self):
+        lines = self.header()
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total, observations) in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + ('+Inf',))} {observations}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {observations}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram("search_stage_seconds", "Latency of search pipeline stages", ("endpoint", "stage")))
+HTTP_REQUEST_SECONDS = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")))
+HTTP_IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being served"))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge("upstream_requests_in_flight", "Calls currently waiting on an upstream service", ("upstream",)))
+UPSTREAM_ERRORS = registry.register(Counter("upstream_errors_total", "Failed calls to upstream services", ("upstream", "stage")))
+UPSTREAM_RETRIES = registry.register(Counter("upstream_retries_total", "Retried calls to upstream services", ("upstream",)))
+CACHE_REQUESTS = registry.register(Counter("cache_requests_total", "Cache lookups by result", ("cache", "result")))
+CACHE_HIT_RATIO = registry.register(Gauge("cache_hit_ratio", "Share of cache lookups served from the cache", ("cache",)))
+UPSTREAM_QUEUED = registry.register(Gauge("upstream_requests_queued", "Calls waiting for an upstream concurrency slot", ("upstream",)))
+UPSTREAM_REJECTED = registry.register(Counter("upstream_rejected_total", "Calls shed because the upstream wait queue was full", ("upstream",)))
+HEDGED_REQUESTS = registry.register(Counter("hedged_requests_total", "Hedged upstream requests by outcome", ("upstream", "outcome")))
+COMPONENT_INIT_SECONDS = registry.register(Gauge("component_init_seconds", "Time taken to build each component on first use", ("component",)))
+SHARD_MISSES = registry.register(Counter("search_shard_misses_total", "Shards left out of merged search results", ("shard", "reason")))
+EMBEDDING_BATCH_SIZE = registry.register(Histogram("embedding_batch_size", "Queries sent per micro-batched embedding call", buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+EMBEDDING_BATCH_WAIT_SECONDS = registry.register(Histogram("embedding_batch_wait_seconds", "Time queries waited for their embedding batch to be sent",
+                                                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)))
+
+
+class SpanExporter:
+    """Appends finished spans as JSON lines to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+span_exporter = SpanExporter(os.getenv("SPAN_EXPORT_PATH")) if os.getenv("SPAN_EXPORT_PATH") else None
+
+
+@contextmanager
+def track_stage(endpoint, stage, upstream=None):
+    """Time a pipeline stage, count upstream errors and export a span if enabled."""
+    start_time = time.perf_counter()
+    start_wall = time.time()
+    if upstream:
+        UPSTREAM_IN_FLIGHT.inc(upstream=upstream)
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = e
+        if upstream:
+            UPSTREAM_ERRORS.inc(upstream=upstream, stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        if upstream:
+            UPSTREAM_IN_FLIGHT.dec(upstream=upstream)
+        STAGE_SECONDS.observe(duration, endpoint=endpoint, stage=stage)
+        logger.info(f"{endpoint} {stage} completed in {duration:.3f} seconds")
+        if span_exporter is not None:
+            span_exporter.export({
+                "request_id": request_id_var.get(),
+                "name": f"{endpoint}.{stage}",
+                "start": start_wall,
+                "duration": duration,
+                "error": repr(error) if error else None,
+            })
+
+
+@contextmanager
+def track_init(component):
+    """Record how long building a component took, including any imports it triggers."""
+    start_time = time.perf_counter()
+    yield
+    duration = time.perf_counter() - start_time
+    COMPONENT_INIT_SECONDS.set(duration, component=component)
+    logger.info(f"Initialized {component} in {duration:.3f} seconds")
+
+
+_cache_totals = {}
+
+
+def record_cache_stats(name, stats):
+    for result, total in (("hit", stats["hits"] + stats.get("coalesced", 0)), ("miss", stats["misses"])):
+        # Caches count from zero again when cleared, so only what is new since the last call is added
+        last = _cache_totals.get((name, result), 0)
+        CACHE_REQUESTS.inc(total - last if total >= last else total, cache=name, result=result)
+        _cache_totals[(name, result)] = total
+    CACHE_HIT_RATIO.set(stats["hit_ratio"], cache=name)
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def install_request_id_logging():
+    """Attach the current request ID to every log record as `request_id`."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_request_id", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.request_id = request_id_var.get()
+        return record
+
+    record_factory.adds_request_id = True
+    logging.setLogRecordFactory(record_factory)
@@ -0,0 +1,77 @@
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset("a an and are as at be by for from has have he her his i in is it its of on or our she that the their they this to was we were what when where which who will with you your".split())
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text with GPT tokenizers
+    return len(text) // 4 + 1
+
+
+def query_terms(query):
+    return {word for word in WORD_PATTERN.findall(query.lower()) if word not in STOPWORDS}
+
+
+def shingles(text, size=3):
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PromptBuilder:
+    """Selects and trims rerank candidates so the prompt stays within a token budget.
+
+    Candidates that are near-duplicates of a higher-ranked candidate are dropped,
+    and long texts are cut down to the window with the most query terms.
+    """
+
+    def __init__(self, token_budget=1500, max_candidate_tokens=200, duplicate_threshold=0.8):
+        self.token_budget = token_budget
+        self.max_candidate_tokens = max_candidate_tokens
+        self.duplicate_threshold = duplicate_threshold
+
+    def deduplicate(self, search_results):
+        kept = []
+        kept_shingles = []
+        for result in search_results:
+            result_shingles = shingles(result['text'])
+            if any(jaccard(result_shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            kept.append(result)
+            kept_shingles.append(result_shingles)
+        return kept
+
+    def window(self, text, terms, max_tokens):
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        words = text.split()
+        # Average characters per word (plus a space) decides how many words fit
+        width = max(1, min(len(words), int(max_tokens * 4 / (len(text) / len(words)))))
+        hits = [1 if word.strip(".,!?;:\"'()").lower() in terms else 0 for word in words]
+        best_start = 0
+        best_hits = window_hits = sum(hits[:width])
+        for start in range(1, len(words) - width + 1):
+            window_hits += hits[start + width - 1] - hits[start - 1]
+            if window_hits > best_hits:
+                best_start, best_hits = start, window_hits
+        snippet = " ".join(words[best_start:best_start + width])
+        prefix = "..." if best_start > 0 else ""
+        suffix = "..." if best_start + width < len(words) else ""
+        return f"{prefix}{snippet}{suffix}"
+
+    def build(self, query, search_results):
+        """Return a list of (result, snippet) pairs in the original ranking order."""
+        candidates = self.deduplicate(search_results)
+        if not candidates:
+            return []
+        terms = query_terms(query)
+        per_candidate = max(1, min(self.max_candidate_tokens, self.token_budget // len(candidates)))
+        return [(result, self.window(result['text'], terms, per_candidate)) for result in candidates]
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from .upstream import Overloaded
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_TOP_SCORE = "top_score"
+SKIPPED_MARGIN = "margin"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+OVERLOADED = "overloaded"
+NO_RANKING = "no_ranking"
+
+
+class RerankPolicy:
+    """Decides when the LLM rerank can be skipped and bounds how long it may take.
+
+    The rerank is skipped when the top vector score is at least `score_threshold`
+    or leads the runner-up by at least `margin_threshold`. A rerank running longer
+    than `deadline` seconds is cancelled and the vector order is used instead,
+    as it is when the LLM is shedding load or its reply holds no usable ranking.
+    """
+
+    def __init__(self, score_threshold=None, margin_threshold=None, deadline=None):
+        self.score_threshold = score_threshold
+        self.margin_threshold = margin_threshold
+        self.deadline = deadline
+
+    def skip_reason(self, search_results):
+        if not search_results:
+            return None
+        scores = sorted((result['score'] for result in search_results), reverse=True)
+        if self.score_threshold is not None and scores[0] >= self.score_threshold:
+            return SKIPPED_TOP_SCORE
+        if self.margin_threshold is not None and len(scores) > 1 and scores[0] - scores[1] >= self.margin_threshold:
+            return SKIPPED_MARGIN
+        return None
+
+    async def run(self, search_results, rerank, fallback):
+        """Return (result, reason); reason is None when the LLM rerank was used."""
+        if not search_results:
+            # Nothing to rank, e.g. a filter that matched no chunks
+            return fallback(), None
+        reason = self.skip_reason(search_results)
+        if reason is not None:
+            return fallback(), reason
+        try:
+            result = await asyncio.wait_for(rerank(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            logger.warning(f"LLM rerank exceeded the {self.deadline:.2f} second deadline, falling back to vector order")
+            return fallback(), DEADLINE_EXCEEDED
+        except Overloaded as e:
+            logger.warning(f"LLM rerank shed ({str(e)}), falling back to vector order")
+            return fallback(), OVERLOADED
+        if not result:
+            logger.warning("LLM rerank returned no usable ranking, falling back to vector order")
+            return fallback(), NO_RANKING
+        return result, None
+
+    def stream(self, search_results, rerank, slot, num_matches=5):
+        return RerankStream(self, search_results, rerank, slot, num_matches)
+
+
+class RerankStream:
+    """Matches of a streamed LLM rerank, completed in vector order when the LLM is not used.
+
+    Iterating yields (result, explanation) pairs. `slot` is an async context
+    manager factory held only while the LLM streams; if it sheds the call,
+    the remaining matches come in vector order, as they do once the LLM has
+    streamed for longer than the policy's deadline. `skip_reason` is final
+    once iteration ends and is None when every match came from the LLM.
+    """
+
+    def __init__(self, policy, search_results, rerank, slot, num_matches=5):
+        self.deadline = policy.deadline
+        self.search_results = search_results
+        self.rerank = rerank
+        self.slot = slot
+        self.num_matches = num_matches
+        self.skip_reason = policy.skip_reason(search_results)
+
+    async def __aiter__(self):
+        emitted = set()
+        if self.skip_reason is None and self.search_results:
+            try:
+                async with self.slot():
+                    loop = asyncio.get_running_loop()
+                    deadline = None if self.deadline is None else loop.time() + self.deadline
+                    ranked = self.rerank()
+                    while True:
+                        # The deadline covers waiting on the LLM, not the caller consuming matches
+                        timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                        try:
+                            result, explanation = await asyncio.wait_for(ranked.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        emitted.add(result['id'])
+                        yield result, explanation
+            except asyncio.TimeoutError:
+                logger.warning(f"LLM rerank exceeded the {self.deadline:.2f} second deadline, falling back to vector order")
+                self.skip_reason = DEADLINE_EXCEEDED
+            except Overloaded as e:
+                logger.warning(f"LLM rerank shed ({str(e)}), falling back to vector order")
+                self.skip_reason = OVERLOADED
+            if not emitted and self.skip_reason is None:
+                logger.warning("LLM rerank returned no usable ranking, falling back to vector order")
+                self.skip_reason = NO_RANKING
+        # Whatever the LLM did not rank follows in vector order
+        remaining = [result for result in self.search_results if result['id'] not in emitted]
+        for match in vector_order_matches(remaining, self.num_matches - len(emitted)):
+            yield match
+
+
+def vector_order_matches(search_results, num_matches=5):
+    # Search backends return results best first
+    return [(result, None) for result in search_results[:num_matches]]
+
+
+def complete_matches(matches, search_results, num_matches=5):
+    """Top up a ranking that came back short, e.g. from a truncated reply, with the next results in vector order."""
+    ranked = {result['id'] for result, _ in matches}
+    remaining = [result for result in search_results if result['id'] not in ranked]
+    return matches + vector_order_matches(remaining, num_matches - len(matches))
+
+
+def vector_order_match(search_results):
+    if not search_results:
+        return None, None, "No clear best match found.", None
+    best_match = search_results[0]
+    metadata = best_match['metadata']
+    return metadata.get('id'), metadata.get('start_time', '0'), "Top vector search result (not reranked).", metadata.get('text', '')
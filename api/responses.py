@@ -0,0 +1,105 @@
+import gzip
+import json
+import hashlib
+from functools import lru_cache
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content):
+    """Serialize to compact UTF-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick `br` or `gzip` from an Accept-Encoding header, or None."""
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    if "br" in accepted and _brotli() is not None:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return _brotli().compress(body, quality=5)
+    # A fixed mtime keeps the output, and so the ETag, stable across requests
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class CompressedJSONResponse(FastJSONResponse):
+    """JSON compressed with brotli or gzip when the client accepts it.
+
+    Bodies under `min_size` bytes are sent as is, since compressing them
+    saves less than it costs.
+    """
+
+    def __init__(self, content, accept_encoding="", min_size=1024, **kwargs):
+        self.encoding = negotiate_encoding(accept_encoding)
+        self.min_size = min_size
+        super().__init__(content, **kwargs)
+        self.headers["Vary"] = "Accept-Encoding"
+        if self.encoding is not None:
+            self.headers["Content-Encoding"] = self.encoding
+
+    def render(self, content):
+        body = dumps(content)
+        if self.encoding is None or len(body) < self.min_size:
+            self.encoding = None
+            return body
+        return compress(body, self.encoding)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as conditional GETs use
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def add_vary(headers, *names):
+    vary = [value.strip() for value in headers.get("vary", "").split(",") if value.strip()]
+    return ", ".join(vary + [name for name in names if name not in vary])
+
+
+def conditional_response(request, response, cache_control, vary=()):
+    """Tag a response with an ETag and Cache-Control; 304 when the client already has it.
+
+    The ETag hashes the encoded body, so each content encoding gets its own.
+    `vary` names request headers, such as the API key, that caches must key on.
+    """
+    etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if "vary" in response.headers or vary:
+        headers["Vary"] = add_vary(response.headers, *vary)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,45 @@
+import time
+import asyncio
+import random
+import logging
+from .metrics import UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error):
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=30.0):
+    # Full jitter: a random delay up to the exponential cap for this attempt
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retry(func, *args, max_attempts=5, base_delay=0.5, max_delay=30.0, upstream=None, **kwargs):
+    for attempt in range(max_attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if upstream:
+                UPSTREAM_RETRIES.inc(upstream=upstream)
+            logger.warning(f"Rate limited calling {getattr(func, '__name__', func)}, retrying in {delay:.2f} seconds")
+            time.sleep(delay)
+
+
+async def call_with_retry_async(func, *args, max_attempts=5, base_delay=0.5, max_delay=30.0, upstream=None, **kwargs):
+    for attempt in range(max_attempts):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if upstream:
+                UPSTREAM_RETRIES.inc(upstream=upstream)
+            logger.warning(f"Rate limited calling {getattr(func, '__name__', func)}, retrying in {delay:.2f} seconds")
+            await asyncio.sleep(delay)
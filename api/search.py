@@ -1,16 +1,36 @@
+import asyncio
+
+
 class PineconeSearch:
-    def __init__(self, index):
+    def __init__(self, index, async_index=None, include_metadata=True, namespace=None):
         self.index = index
+        self.async_index = async_index
+        self.query_options = {"namespace": namespace} if namespace else {}
+        # Without metadata matches carry only IDs and scores; see HydratedSearch
+        self.include_metadata = include_metadata
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        results = self.index.query(vector=query_embedding, top_k=n_results, include_metadata=self.include_metadata, include_values=include_values, filter=filter, **self.query_options)
+        return self._format_matches(results, include_values)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        if self.async_index is None:
+            return await asyncio.to_thread(self.find_nearest, query_embedding, n_results, include_values=include_values, filter=filter)
+        results = await self.async_index.query(vector=query_embedding, top_k=n_results, include_metadata=self.include_metadata, include_values=include_values, filter=filter, **self.query_options)
+        return self._format_matches(results, include_values)
 
-    def find_nearest(self, query_embedding, n_results=10):
-        results = self.index.query(vector=query_embedding, top_k=n_results, include_metadata=True)
+    def _format_matches(self, results, include_values=False):
         matches = results.get('matches', [])
-        return [
-            {
+        formatted = []
+        for match in matches:
+            metadata = (match['metadata'] if self.include_metadata else None) or {}
+            formatted.append({
                 "id": match['id'],
                 "score": match['score'],
-                "metadata": match['metadata'],
-                "text": match['metadata'].get('text', '')
-            }
-            for match in matches
-        ]
\ No newline at end of file
+                "metadata": metadata,
+                "text": metadata.get('text', '')
+            })
+        if include_values:
+            for result, match in zip(formatted, matches):
+                result["values"] = list(match['values'])
+        return formatted
\ No newline at end of file
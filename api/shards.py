@@ -0,0 +1,118 @@
+import heapq
+import asyncio
+import logging
+import contextvars
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
+from .metrics import SHARD_MISSES
+
+logger = logging.getLogger(__name__)
+
+missing_shards_var = contextvars.ContextVar("missing_shards", default=None)
+
+
+def track_missing_shards():
+    """Start recording shards left out of results in the current request.
+
+    Returns the set that ShardedSearch adds shard names to. It is shared with
+    tasks spawned afterwards, so wrappers that fan out still report into it.
+    """
+    missing = set()
+    missing_shards_var.set(missing)
+    return missing
+
+
+def parse_shards(spec, default_index):
+    """Parse `index`, `index:namespace` or `:namespace` entries separated by commas."""
+    shards = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        index_name, _, namespace = entry.partition(":")
+        shards.append((index_name or default_index, namespace or None))
+    return shards
+
+
+def merge_top_k(shard_results, n_results):
+    """Merge per-shard result lists, each sorted best first, into the global top `n_results`."""
+    merged = heapq.merge(*shard_results, key=lambda result: result['score'], reverse=True)
+    return list(islice(merged, n_results))
+
+
+class ShardedSearch:
+    """Queries every shard concurrently and merges their top-k into one ranking.
+
+    `shards` is a list of (name, backend) pairs, e.g. one PineconeSearch per
+    index or namespace. Shards that fail or take longer than `timeout`
+    seconds are left out; their names are added to the set from
+    `track_missing_shards` so callers can mark the results as partial.
+    Scores must be comparable across shards (same embedding model and metric).
+    """
+
+    def __init__(self, shards, timeout=1.0):
+        self.shards = shards
+        self.timeout = timeout
+        self._executor = None
+
+    def _record_missing(self, name, reason):
+        SHARD_MISSES.inc(shard=name, reason=reason)
+        missing = missing_shards_var.get()
+        if missing is not None:
+            missing.add(name)
+
+    def _merge(self, outcomes, n_results):
+        answered = []
+        errors = []
+        for name, outcome in outcomes:
+            if outcome is None:
+                logger.warning(f"Shard {name} timed out after {self.timeout} seconds")
+                self._record_missing(name, "timeout")
+            elif isinstance(outcome, Exception):
+                logger.warning(f"Shard {name} failed: {outcome}")
+                self._record_missing(name, "error")
+                errors.append(outcome)
+            else:
+                answered.append(outcome)
+        if not answered:
+            if errors:
+                raise errors[0]
+            raise TimeoutError(f"No shard answered within {self.timeout} seconds")
+        return merge_top_k(answered, n_results)
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.shards))
+        futures = [
+            self._executor.submit(backend.find_nearest, query_embedding, n_results, query_text=query_text, include_values=include_values, filter=filter)
+            for _, backend in self.shards
+        ]
+        wait(futures, timeout=self.timeout)
+        outcomes = []
+        for (name, _), future in zip(self.shards, futures):
+            if not future.done():
+                future.cancel()
+                outcomes.append((name, None))
+            else:
+                outcomes.append((name, future.exception() or future.result()))
+        return self._merge(outcomes, n_results)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        tasks = [
+            asyncio.ensure_future(backend.find_nearest_async(query_embedding, n_results, query_text=query_text, include_values=include_values, filter=filter))
+            for _, backend in self.shards
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        outcomes = []
+        for (name, _), task in zip(self.shards, tasks):
+            if task in pending:
+                outcomes.append((name, None))
+            else:
+                outcomes.append((name, task.exception() or task.result()))
+        return self._merge(outcomes, n_results)
+
+    @property
+    def async_index(self):
+        return getattr(self.shards[0][1], "async_index", None) if self.shards else None
@@ -0,0 +1,83 @@
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+# Runs in a fresh interpreter so nothing is already imported
+CHILD_SCRIPT = """
+import sys, json, time
+start_time = time.perf_counter()
+from api import main
+import_seconds = time.perf_counter() - start_time
+init = {}
+if sys.argv[1] == "init":
+    from api.metrics import COMPONENT_INIT_SECONDS
+    main.initialize_components()
+    init = {labels["component"]: value for labels, value in COMPONENT_INIT_SECONDS.samples()}
+print(json.dumps({"import_seconds": import_seconds, "init_seconds": init}))
+"""
+
+
+def parse_importtime(output):
+    """Parse `python -X importtime` output into (module, self seconds, cumulative seconds) rows."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def by_package(rows):
+    """Total self time per top-level package, slowest first."""
+    totals = defaultdict(float)
+    for module, self_seconds, _ in rows:
+        totals[module.split(".")[0]] += self_seconds
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile_startup(init=False, env=None):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT, "init" if init else "import"],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiling failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+    report["packages"] = [{"package": package, "seconds": round(seconds, 4)} for package, seconds in by_package(rows)]
+    report["modules"] = [
+        {"module": module, "self_seconds": round(self_seconds, 4), "cumulative_seconds": round(cumulative, 4)}
+        for module, self_seconds, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)
+    ]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import and component initialization time of the API")
+    parser.add_argument("--init", action="store_true", help="Also build the clients (needs credentials; calls Pinecone to resolve the index host)")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages and modules to list")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = profile_startup(init=args.init)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Import of api.main: {report['import_seconds']:.3f} seconds")
+    print("\nSelf time by package:")
+    for entry in report["packages"][:args.top]:
+        print(f"  {entry['seconds']:8.4f}  {entry['package']}")
+    print("\nSlowest modules (cumulative):")
+    for entry in report["modules"][:args.top]:
+        print(f"  {entry['cumulative_seconds']:8.4f}  {entry['module']}")
+    if report["init_seconds"]:
+        print("\nComponent initialization:")
+        for component, seconds in report["init_seconds"].items():
+            print(f"  {seconds:8.4f}  {component}")
+
+
+if __name__ == "__main__":
+    main()
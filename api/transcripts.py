@@ -0,0 +1,138 @@
+import os
+import json
+import mmap
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VIDEOS_FILE = "videos.json"
+VIDEO_OFFSETS_FILE = "video_offsets.npy"
+STARTS_FILE = "starts.npy"
+ENDS_FILE = "ends.npy"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+TEXT_FILE = "text.bin"
+
+
+def segment_start(segment):
+    return float(segment.get("start_time", segment.get("start", 0)))
+
+
+class TranscriptStoreWriter:
+    """Builds a transcript store from raw transcript segments.
+
+    Segments are grouped by video and sorted by start time. All texts go into
+    one UTF-8 buffer addressed by an offsets array, and each video owns a
+    contiguous range of the start/end arrays. Videos already in the store at
+    `path` are kept unless they are added again, in which case the new
+    segments replace theirs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._videos = {}
+
+    def add(self, segment):
+        text = segment.get("text", "").strip()
+        if not text or "video_id" not in segment:
+            return
+        start = segment_start(segment)
+        end = start + float(segment["duration"]) if segment.get("duration") is not None else np.nan
+        self._videos.setdefault(segment["video_id"], []).append((start, end, text))
+
+    def _keep_existing(self):
+        if not os.path.exists(os.path.join(self.path, VIDEOS_FILE)):
+            return
+        store = TranscriptStore(self.path)
+        try:
+            for video_id, position in store.videos.items():
+                if video_id in self._videos:
+                    continue
+                first, last = int(store.video_offsets[position]), int(store.video_offsets[position + 1])
+                self._videos[video_id] = [(float(store.starts[i]), float(store.ends[i]), store.text(i)) for i in range(first, last)]
+        finally:
+            # The files are rewritten below, so nothing may stay mapped
+            store.close()
+
+    def close(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._keep_existing()
+        video_offsets = [0]
+        starts, ends, texts = [], [], []
+        for segments in self._videos.values():
+            segments.sort(key=lambda segment: segment[0])
+            video_starts = np.array([segment[0] for segment in segments], dtype=np.float64)
+            video_ends = np.array([segment[1] for segment in segments], dtype=np.float64)
+            # Segments without a duration end where the next one starts
+            missing = np.isnan(video_ends)
+            video_ends[missing] = np.append(video_starts[1:], video_starts[-1])[missing]
+            starts.append(video_starts)
+            ends.append(video_ends)
+            texts.extend(segment[2].encode("utf-8") for segment in segments)
+            video_offsets.append(video_offsets[-1] + len(segments))
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(text) for text in texts])
+
+        with open(os.path.join(self.path, TEXT_FILE), "wb") as f:
+            f.write(b"".join(texts))
+        np.save(os.path.join(self.path, TEXT_OFFSETS_FILE), text_offsets)
+        np.save(os.path.join(self.path, STARTS_FILE), np.concatenate(starts) if starts else np.empty(0))
+        np.save(os.path.join(self.path, ENDS_FILE), np.concatenate(ends) if ends else np.empty(0))
+        np.save(os.path.join(self.path, VIDEO_OFFSETS_FILE), np.array(video_offsets, dtype=np.int64))
+        with open(os.path.join(self.path, VIDEOS_FILE), "w") as f:
+            json.dump(list(self._videos), f)
+        logger.info(f"Wrote {len(texts)} transcript segments of {len(self._videos)} videos to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TranscriptStore:
+    """Surrounding transcript text for a timestamp, found by binary search."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, VIDEOS_FILE)) as f:
+            self.videos = {video_id: position for position, video_id in enumerate(json.load(f))}
+        self.video_offsets = np.load(os.path.join(path, VIDEO_OFFSETS_FILE))
+        self.starts = np.load(os.path.join(path, STARTS_FILE), mmap_mode="r")
+        self.ends = np.load(os.path.join(path, ENDS_FILE), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, TEXT_OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, TEXT_FILE), "rb") as f:
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.text_offsets[-1] else b""
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self.starts = self.ends = self.text_offsets = None
+
+    def window(self, video_id, start, end):
+        """Segment positions of `video_id` that overlap [start, end]."""
+        position = self.videos.get(video_id)
+        if position is None:
+            return range(0)
+        first, last = int(self.video_offsets[position]), int(self.video_offsets[position + 1])
+        starts = self.starts[first:last]
+        # The segment in progress at `start`, through the last one starting by `end`
+        low = max(int(np.searchsorted(starts, start, "right")) - 1, 0)
+        if low < len(starts) and self.ends[first + low] < start:
+            low += 1
+        high = int(np.searchsorted(starts, end, "right"))
+        return range(first + low, first + high)
+
+    def text(self, position):
+        return self._text[self.text_offsets[position]:self.text_offsets[position + 1]].decode("utf-8")
+
+    def context(self, video_id, timestamp, seconds):
+        """Transcript from `seconds` before to `seconds` after `timestamp`; None for unknown videos."""
+        positions = self.window(video_id, timestamp - seconds, timestamp + seconds)
+        if not positions:
+            return None
+        return {
+            "start_time": float(self.starts[positions[0]]),
+            "end_time": float(self.ends[positions[-1]]),
+            "text": " ".join(self.text(position) for position in positions),
+        }
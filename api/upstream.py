@@ -0,0 +1,205 @@
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+import numpy as np
+from .retry import call_with_retry_async, is_rate_limit_error
+from .metrics import UPSTREAM_QUEUED, UPSTREAM_REJECTED, HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """An upstream cannot take more work right now; clients should retry after `retry_after` seconds."""
+
+    def __init__(self, upstream, retry_after, status_code=503):
+        super().__init__(f"{upstream} is overloaded, retry after {retry_after} seconds")
+        self.upstream = upstream
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class UpstreamLimiter:
+    """Caps concurrent calls to one upstream, with a bounded queue of waiting calls.
+
+    Calls beyond `max_concurrency` wait in FIFO order. When `max_queue` calls
+    are already waiting, or a call waits longer than `queue_timeout` seconds,
+    it is rejected with Overloaded instead of adding to the backlog.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue, queue_timeout=None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.average_seconds = 0.1
+        self._waiters = deque()
+
+    def retry_after(self):
+        # Time for the current backlog to drain at the recent per-call latency
+        backlog = (len(self._waiters) + 1) / self.max_concurrency
+        return max(1, math.ceil(self.average_seconds * backlog))
+
+    def _reject(self):
+        UPSTREAM_REJECTED.inc(upstream=self.name)
+        return Overloaded(self.name, self.retry_after())
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        UPSTREAM_QUEUED.inc(upstream=self.name)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject()
+            raise
+        finally:
+            UPSTREAM_QUEUED.dec(upstream=self.name)
+
+    def try_acquire(self):
+        """Take a slot only if one is free right now, without queueing."""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * (time.perf_counter() - start_time)
+            self.release()
+
+
+async def call_upstream(limiter, func, *args, max_attempts=3, **kwargs):
+    """Call an upstream within its concurrency limit, retrying rate limits with jittered backoff.
+
+    A rate limit that persists after the retries is raised as a 429 Overloaded.
+    """
+    async with limiter.slot():
+        try:
+            return await call_with_retry_async(func, *args, max_attempts=max_attempts, upstream=limiter.name, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise Overloaded(limiter.name, limiter.retry_after(), status_code=429) from e
+            raise
+
+
+class LatencyWindow:
+    """Recent call latencies in a fixed-size ring buffer."""
+
+    def __init__(self, size=200):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, seconds):
+        self.values[self.count % len(self.values)] = seconds
+        self.count += 1
+
+    def quantile(self, q):
+        filled = self.values[:min(self.count, len(self.values))]
+        return float(np.quantile(filled, q)) if len(filled) else None
+
+
+class HedgedSearch:
+    """Sends a second query when the first is slower than the recent p95 and uses whichever answers first.
+
+    Until `min_samples` latencies have been seen the hedge delay is
+    `initial_delay`; it never drops below `min_delay`. The hedge takes its own
+    slot of `limiter`, and is not sent when no slot is free, so hedging never
+    adds load beyond the upstream's concurrency limit.
+    """
+
+    def __init__(self, backend, quantile=0.95, min_delay=0.02, initial_delay=0.5, min_samples=20, upstream="pinecone", limiter=None):
+        self.backend = backend
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.upstream = upstream
+        self.limiter = limiter
+        self.latencies = LatencyWindow()
+
+    def hedge_delay(self):
+        if self.latencies.count < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.latencies.quantile(self.quantile))
+
+    async def _timed(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        result = await self.backend.find_nearest_async(*args, **kwargs)
+        self.latencies.add(time.perf_counter() - start_time)
+        return result
+
+    async def _hedge(self, *args, **kwargs):
+        try:
+            return await self._timed(*args, **kwargs)
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+
+    def find_nearest(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        return self.backend.find_nearest(query_embedding, n_results, query_text=query_text, include_values=include_values, filter=filter)
+
+    async def find_nearest_async(self, query_embedding, n_results=10, query_text=None, include_values=False, filter=None):
+        args = (query_embedding, n_results)
+        kwargs = {"query_text": query_text, "include_values": include_values, "filter": filter}
+        primary = asyncio.ensure_future(self._timed(*args, **kwargs))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if done:
+                return primary.result()
+
+            if self.limiter is not None and not self.limiter.try_acquire():
+                HEDGED_REQUESTS.inc(upstream=self.upstream, outcome="skipped")
+                return await primary
+            HEDGED_REQUESTS.inc(upstream=self.upstream, outcome="sent")
+            hedge = asyncio.ensure_future(self._hedge(*args, **kwargs))
+            tasks.append(hedge)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGED_REQUESTS.inc(upstream=self.upstream, outcome="won")
+                        return task.result()
+            # Both failed; surface the primary's error
+            return primary.result()
+        finally:
+            # Also when the caller is cancelled, e.g. a shard past its timeout,
+            # so no query keeps running outside its limiter slot
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @property
+    def async_index(self):
+        return getattr(self.backend, "async_index", None)
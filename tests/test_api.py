@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+from api import main
 from api.main import app, verify_api_key, initialize_components
 import os
 import hashlib
@@ -18,12 +19,18 @@ def mock_api_key():
 def mock_dependencies():
     mock_embedding_generator = MagicMock()
     mock_embedding_generator.generate_embedding.return_value = [0.1] * 3072
+    mock_embedding_generator.generate_embedding_async = AsyncMock(return_value=[0.1] * 3072)
+    mock_embedding_generator.generate_embeddings_async = AsyncMock(return_value=[])
+    mock_embedding_generator.batcher = None
 
     mock_pinecone_search = MagicMock()
     mock_pinecone_search.find_nearest.return_value = []
+    mock_pinecone_search.find_nearest_async = AsyncMock(return_value=[])
 
     mock_llm_handler = MagicMock()
     mock_llm_handler.find_best_match.return_value = ('video1', '00:01:00', 'This is the best match')
+    mock_llm_handler.find_best_match_async = AsyncMock(return_value=('video1', '00:01:00', 'This is the best match', 'text'))
+    mock_llm_handler.find_best_matches_async = AsyncMock(return_value=[])
 
     with patch('api.main.initialize_components') as mock_initialize_components:
         mock_initialize_components.return_value = (mock_embedding_generator, mock_pinecone_search, mock_llm_handler)
@@ -41,4 +48,190 @@ def test_search_endpoint_invalid_api_key():
         headers={"X-API-Key": "invalid_api_key"}
     )
     assert response.status_code == 403
-    assert response.json() == {"detail": "Could not validate API key"}
\ No newline at end of file
+    assert response.json() == {"detail": "Could not validate API key"}
+
+def test_search_multiple_reuses_cached_response(mock_api_key):
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        for _ in range(2):
+            response = client.post(
+                "/search_multiple/",
+                json={"text": "test query"},
+                headers={"X-API-Key": mock_api_key}
+            )
+            assert response.status_code == 200
+    _, mock_pinecone_search, _ = main.initialize_components()
+    mock_pinecone_search.find_nearest_async.assert_awaited_once()
+
+def test_search_batch_embeds_once(mock_api_key):
+    embedding_generator, mock_pinecone_search, mock_llm_handler = main.initialize_components()
+    embedding_generator.generate_embeddings_async.return_value = [[0.1] * 3072, [0.2] * 3072]
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.post(
+            "/search_batch/",
+            json={"queries": ["first query", "second query"]},
+            headers={"X-API-Key": mock_api_key}
+        )
+    assert response.status_code == 200
+    assert [result["query"] for result in response.json()["results"]] == ["first query", "second query"]
+    embedding_generator.generate_embeddings_async.assert_awaited_once()
+    assert mock_pinecone_search.find_nearest_async.await_count == 2
+    mock_llm_handler.find_best_matches_async.assert_not_called()
+
+def test_search_multiple_stream_emits_hits_then_matches(mock_api_key):
+    _, mock_pinecone_search, mock_llm_handler = main.initialize_components()
+    hit = {'id': '1', 'score': 0.9, 'metadata': {'id': 'video1', 'start_time': '12.5', 'text': 'hello'}, 'text': 'hello'}
+    mock_pinecone_search.find_nearest_async.return_value = [hit]
+
+    async def stream_best_matches(query, search_results):
+        yield hit, "Because"
+
+    mock_llm_handler.stream_best_matches = stream_best_matches
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.post(
+            "/search_multiple/stream",
+            json={"text": "streamed query"},
+            headers={"X-API-Key": mock_api_key}
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["hits", "match", "done"]
+    assert '"explanation": "Because"' in response.text
+
+def test_search_falls_back_to_vector_order_when_llm_picks_nothing(mock_api_key):
+    from api.llm import LLMHandler
+    mock_embedding_generator, mock_pinecone_search, _ = main.initialize_components()
+    hit = {'id': '1', 'score': 0.5, 'metadata': {'id': 'video1', 'start_time': '12.5', 'text': 'hello'}, 'text': 'hello'}
+    mock_pinecone_search.find_nearest_async.return_value = [hit]
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=MagicMock(content='{"matches": []}'))]))
+    with patch('api.llm.OpenAI'):
+        llm_handler = LLMHandler("gpt-4", async_client=async_client)
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()), \
+            patch('api.main.initialize_components', return_value=(mock_embedding_generator, mock_pinecone_search, llm_handler)):
+        response = client.post("/search/", json={"text": "nothing fits"}, headers={"X-API-Key": mock_api_key})
+    assert response.status_code == 200
+    assert response.json()["video_id"] == "video1"
+    assert response.json()["rerank_skipped_reason"] == "no_ranking"
+    async_client.chat.completions.create.assert_awaited_once()
+
+def test_filtered_search_without_hits_skips_the_llm(mock_api_key):
+    _, mock_pinecone_search, mock_llm_handler = main.initialize_components()
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.post("/search/", json={"text": "no such channel", "channel_id": "UCnothing"}, headers={"X-API-Key": mock_api_key})
+    assert response.status_code == 200
+    assert response.json()["message"] == "No specific match found"
+    assert mock_pinecone_search.find_nearest_async.await_args.kwargs["filter"] is not None
+    mock_llm_handler.find_best_match_async.assert_not_called()
+
+def test_metrics_endpoint_reports_stage_latency(mock_api_key):
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.post(
+            "/search_multiple/",
+            json={"text": "metrics query"},
+            headers={"X-API-Key": mock_api_key, "X-Request-ID": "req-123"}
+        )
+        assert response.headers["X-Request-ID"] == "req-123"
+        assert client.get("/metrics", headers={"X-API-Key": "wrong_key"}).status_code == 403
+        response = client.get("/metrics", headers={"X-API-Key": mock_api_key})
+    assert response.status_code == 200
+    assert 'search_stage_seconds_count{endpoint="search_multiple",stage="retrieval"}' in response.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/search_multiple/",status="200"}' in response.text
+    assert 'cache_hit_ratio{cache="response"}' in response.text
+    assert '# TYPE cache_requests_total counter' in response.text
+
+def test_search_sheds_load_with_retry_after(mock_api_key):
+    from api.upstream import UpstreamLimiter
+    full = UpstreamLimiter("pinecone", max_concurrency=1, max_queue=0)
+    full.active = 1
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()), \
+            patch('api.main.pinecone_limiter', full):
+        response = client.post(
+            "/search_multiple/",
+            json={"text": "shed query"},
+            headers={"X-API-Key": mock_api_key}
+        )
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_search_multiple_reuses_results_of_similar_query(mock_api_key):
+    from api.cache import SemanticCache
+    _, mock_pinecone_search, _ = main.initialize_components()
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()), \
+            patch('api.main.semantic_cache', SemanticCache(max_size=8, threshold=0.95)):
+        for text in ("worst 1v1 keep-up fail", "worst 1v1 ball keep up ever"):
+            response = client.post(
+                "/search_multiple/",
+                json={"text": text},
+                headers={"X-API-Key": mock_api_key}
+            )
+            assert response.status_code == 200
+    mock_pinecone_search.find_nearest_async.assert_awaited_once()
+
+def test_search_multiple_pushes_filters_down(mock_api_key):
+    _, mock_pinecone_search, _ = main.initialize_components()
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        for channel_id in ("channel1", "channel2"):
+            response = client.post(
+                "/search_multiple/",
+                json={"text": "filtered query", "channel_id": channel_id, "published_after": "2024-01-01"},
+                headers={"X-API-Key": mock_api_key}
+            )
+            assert response.status_code == 200
+    # Different filters are cached separately
+    assert mock_pinecone_search.find_nearest_async.await_count == 2
+    filter = mock_pinecone_search.find_nearest_async.await_args.kwargs["filter"]
+    assert filter["channel_id"] == {"$eq": "channel2"}
+    assert filter["published_at"] == {"$gte": 1704067200}
+
+def test_get_search_multiple_is_cacheable_and_canonical(mock_api_key):
+    _, mock_pinecone_search, _ = main.initialize_components()
+    headers = {"X-API-Key": mock_api_key}
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.get("/search_multiple?text=GET%20%20Query&author=someone", headers=headers, follow_redirects=False)
+        assert response.status_code == 308
+        assert response.headers["location"] == "/search_multiple?author=someone&text=get+query"
+
+        response = client.get(response.headers["location"], headers=headers)
+        assert response.status_code == 200
+        assert response.json()["results"] == []
+        assert "max-age" in response.headers["cache-control"]
+        assert "X-API-Key" in response.headers["vary"]
+
+        response = client.get("/search_multiple?author=someone&text=get+query", headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+    assert mock_pinecone_search.find_nearest_async.await_args.kwargs["filter"] == {"author": {"$eq": "someone"}}
+
+def test_search_multiple_returns_transcript_context(mock_api_key, tmp_path):
+    from api.transcripts import TranscriptStore, TranscriptStoreWriter
+    with TranscriptStoreWriter(str(tmp_path)) as writer:
+        for start, text in [(50.0, "before"), (60.0, "match"), (70.0, "after")]:
+            writer.add({"video_id": "video1", "start": start, "duration": 10.0, "text": text})
+    _, mock_pinecone_search, mock_llm_handler = main.initialize_components()
+    result = {"id": "vec1", "score": 0.9, "metadata": {"id": "video1", "start_time": "60", "text": "match"}, "text": "match"}
+    mock_pinecone_search.find_nearest_async.return_value = [result]
+    mock_llm_handler.find_best_matches_async.return_value = [(result, "Because")]
+    headers = {"X-API-Key": mock_api_key}
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        response = client.post("/search_multiple/", json={"text": "context query", "context_seconds": 5}, headers=headers)
+        assert response.status_code == 400
+        with patch('api.main.transcript_store', TranscriptStore(str(tmp_path))):
+            response = client.post("/search_multiple/", json={"text": "context query", "context_seconds": 5}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["results"][0]["context"] == {"start_time": 50.0, "end_time": 70.0, "text": "before match"}
+
+def test_search_multiple_marks_partial_results_and_skips_cache(mock_api_key):
+    from api.shards import missing_shards_var
+    _, mock_pinecone_search, _ = main.initialize_components()
+
+    async def find_nearest_async(*args, **kwargs):
+        missing_shards_var.get().add("index:slow")
+        return []
+    mock_pinecone_search.find_nearest_async = AsyncMock(side_effect=find_nearest_async)
+    with patch('api.main.API_KEY_HASH', hashlib.sha256(mock_api_key.encode()).hexdigest()):
+        for _ in range(2):
+            response = client.post("/search_multiple/", json={"text": "sharded query"}, headers={"X-API-Key": mock_api_key})
+            assert response.status_code == 200
+            assert response.json()["partial"] is True
+            assert response.json()["missing_shards"] == ["index:slow"]
+    assert mock_pinecone_search.find_nearest_async.await_count == 2
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from api.batcher import EmbeddingBatcher
+from api.metrics import EMBEDDING_BATCH_SIZE
+
+
+def recording_embedder(calls):
+    async def embed_many(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0)
+        return [[float(len(text))] for text in texts]
+    return embed_many
+
+async def test_concurrent_queries_share_one_call():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embedder(calls), max_batch_size=16, max_wait=0.01)
+    before = EMBEDDING_BATCH_SIZE.count()
+
+    results = await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "a", "ccc"]))
+
+    assert results == [[1.0], [2.0], [1.0], [3.0]]
+    assert calls == [["a", "bb", "ccc"]]
+    assert EMBEDDING_BATCH_SIZE.count() == before + 1
+
+async def test_full_batch_is_sent_without_waiting():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embedder(calls), max_batch_size=2, max_wait=60)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.embed(text) for text in ["a", "b", "c", "d"])), timeout=1)
+    assert results == [[1.0]] * 4
+    assert calls == [["a", "b"], ["c", "d"]]
+
+async def test_failed_call_fails_every_waiter():
+    async def embed_many(texts):
+        raise RuntimeError("rate limited")
+    batcher = EmbeddingBatcher(embed_many, max_wait=0.001)
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        await batcher.embed("c")
+
+async def test_in_flight_sends_are_referenced_until_done():
+    release = asyncio.Event()
+
+    async def embed_many(texts):
+        await release.wait()
+        return [[1.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(embed_many, max_batch_size=1)
+    pending = asyncio.ensure_future(batcher.embed("a"))
+    await asyncio.sleep(0)
+    assert len(batcher._tasks) == 1
+    release.set()
+    assert await pending == [1.0]
+    await asyncio.sleep(0)
+    assert not batcher._tasks
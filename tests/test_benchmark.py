@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from api.benchmark import Latency, Upstream, fake_openai_app, fake_pinecone_app, summarize
+
+
+def test_summarize_reports_throughput_and_percentiles():
+    result = summarize([0.1] * 98 + [1.0, 2.0], errors=2, elapsed=10.0)
+    assert result["requests"] == 102
+    assert result["errors"] == 2
+    assert result["requests_per_second"] == 10.0
+    assert result["p50_ms"] == 100.0
+    assert result["p99_ms"] > result["p95_ms"]
+
+def test_latency_matches_configured_median():
+    latency = Latency(median=0.01, p99=0.05)
+    samples = sorted(latency.sample() for _ in range(2000))
+    assert 0.008 < samples[1000] < 0.012
+    assert Latency(0.0).sample() == 0.0
+
+def test_fake_openai_serves_embeddings_and_structured_rankings():
+    upstream = Upstream(Latency(0.0))
+    client = TestClient(fake_openai_app(upstream, upstream, dimensions=8))
+    embeddings = client.post("/v1/embeddings", json={"model": "m", "input": ["a", "b"]}).json()
+    assert [len(item["embedding"]) for item in embeddings["data"]] == [8, 8]
+    completion = client.post("/v1/chat/completions", json={"model": "m", "messages": [{"role": "user", "content": "q"}], "response_format": {"type": "json_schema"}}).json()
+    assert '"matches"' in completion["choices"][0]["message"]["content"]
+
+def test_fake_upstream_injects_errors():
+    client = TestClient(fake_pinecone_app(Upstream(Latency(0.0), error_rate=1.0, error_status=429), "http://localhost"))
+    assert client.post("/query", json={"topK": 3}).status_code == 429
+    assert client.get("/indexes/test").json()["host"] == "http://localhost"
@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock, AsyncMock
+from api.bm25 import BM25IndexWriter, BM25Index, HybridSearch, reciprocal_rank_fusion
+
+
+def build_index(path):
+    texts = [
+        "the ball keep up challenge went wrong",
+        "a long talk about football tactics and formations",
+        "Mbappe scores again in the final minute",
+        "keep up keep up keep up the ball",
+    ]
+    with BM25IndexWriter(str(path)) as writer:
+        for i, text in enumerate(texts):
+            writer.add(f"chunk{i}", text, {"id": f"video{i}", "text": text})
+    return BM25Index(str(path))
+
+def test_bm25_ranks_exact_terms(tmp_path):
+    index = build_index(tmp_path)
+    results = index.search("mbappe", n_results=5)
+    assert [result["id"] for result in results] == ["chunk2"]
+    assert results[0]["metadata"]["id"] == "video2"
+
+    results = index.search("keep up ball", n_results=5)
+    assert [result["id"] for result in results] == ["chunk3", "chunk0"]
+
+def test_bm25_search_applies_filter(tmp_path):
+    index = build_index(tmp_path)
+    results = index.search("keep up ball", n_results=5, filter={"id": {"$eq": "video0"}})
+    assert [result["id"] for result in results] == ["chunk0"]
+
+def test_bm25_unknown_terms_return_nothing(tmp_path):
+    assert build_index(tmp_path).search("zzz", n_results=5) == []
+
+def test_reciprocal_rank_fusion_prefers_results_in_both_lists():
+    dense = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}]
+    sparse = [{"id": "b", "score": 0.0}, {"id": "c", "score": 0.0}]
+    fused = reciprocal_rank_fusion([dense, sparse], n_results=3)
+    assert [result["id"] for result in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == 0.8
+
+async def test_hybrid_search_adds_sparse_hits(tmp_path):
+    dense = MagicMock()
+    dense.find_nearest_async = AsyncMock(return_value=[{"id": "chunk1", "score": 0.7, "metadata": {}, "text": ""}])
+    hybrid = HybridSearch(dense, build_index(tmp_path))
+    results = await hybrid.find_nearest_async([0.1], n_results=5, query_text="mbappe")
+    assert {result["id"] for result in results} == {"chunk1", "chunk2"}
+
+def test_append_merges_postings_and_skips_known_ids(tmp_path):
+    build_index(tmp_path)
+    with BM25IndexWriter(str(tmp_path), append=True) as writer:
+        writer.add("chunk0", "replaced text", {"id": "video0"})
+        writer.add("chunk9", "another ball game", {"id": "video9"})
+    index = BM25Index(str(tmp_path))
+    assert index.count == 5
+    assert {result["id"] for result in index.search("ball")} == {"chunk0", "chunk3", "chunk9"}
+    assert index.search("replaced") == []
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+import numpy as np
+from api.cache import EmbeddingCache, ResponseCache, SemanticCache
+
+
+def test_cache_hit_and_miss_counters():
+    cache = EmbeddingCache(max_size=4)
+    assert cache.get("test query", "model") is None
+    cache.put("test query", "model", [0.1] * 8)
+    cached = cache.get("  Test   QUERY ", "model")
+    assert cached.dtype == np.float32
+    assert len(cached) == 8
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_cache_is_keyed_by_model():
+    cache = EmbeddingCache()
+    cache.put("test query", "model-a", [0.1] * 8)
+    assert cache.get("test query", "model-b") is None
+
+def test_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", "model", [0.1])
+    cache.put("b", "model", [0.2])
+    cache.get("a", "model")
+    cache.put("c", "model", [0.3])
+    assert cache.get("b", "model") is None
+    assert cache.get("a", "model") is not None
+
+def test_cache_ttl_expires_entries():
+    cache = EmbeddingCache(ttl=0)
+    cache.put("a", "model", [0.1])
+    assert cache.get("a", "model") is None
+
+def test_cache_persists_to_disk(tmp_path):
+    path = str(tmp_path / "embeddings.npz")
+    cache = EmbeddingCache(path=path)
+    cache.put("a", "model", [0.1, 0.2])
+    cache.put("b", "model", [0.3, 0.4, 0.5])
+    cache.save()
+
+    reloaded = EmbeddingCache(path=path)
+    assert len(reloaded) == 2
+    np.testing.assert_allclose(reloaded.get("b", "model"), [0.3, 0.4, 0.5], rtol=1e-6)
+
+async def test_response_cache_single_flight():
+    cache = ResponseCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"results": []}
+
+    results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+    assert calls == 1
+    assert all(result == {"results": []} for result in results)
+    assert cache.stats()["coalesced"] == 4
+
+    await cache.get_or_compute("key", compute)
+    assert calls == 1
+    assert cache.stats()["hits"] == 1
+
+async def test_response_cache_does_not_store_failures():
+    cache = ResponseCache()
+
+    async def compute():
+        raise RuntimeError("upstream failed")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("key", compute)
+    assert cache.get("key") is None
+    assert cache.stats()["in_flight"] == 0
+
+def test_semantic_cache_reuses_similar_queries():
+    cache = SemanticCache(max_size=4, threshold=0.95)
+    cache.put("search", [1.0, 0.0, 0.0], {"results": ["a"]})
+    assert cache.get("search", [0.99, 0.05, 0.0]) == {"results": ["a"]}
+    assert cache.get("search", [0.0, 1.0, 0.0]) is None
+    assert cache.get("search_multiple", [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache(max_size=2, threshold=0.99)
+    cache.put("ns", [1.0, 0.0], "x")
+    cache.put("ns", [0.0, 1.0], "y")
+    cache.get("ns", [1.0, 0.0])
+    cache.put("ns", [-1.0, 0.0], "z")
+    assert cache.get("ns", [1.0, 0.0]) == "x"
+    assert cache.get("ns", [0.0, 1.0]) is None
+    assert cache.stats()["size"] == 2
+
+def test_semantic_cache_invalidate():
+    cache = SemanticCache(max_size=2, threshold=0.9)
+    cache.put("ns", [1.0, 0.0], "x")
+    cache.invalidate()
+    assert cache.get("ns", [1.0, 0.0]) is None
+    cache.put("ns", [1.0, 0.0, 0.0], "wider")
+    assert cache.get("ns", [1.0, 0.0, 0.0]) == "wider"
+
+async def test_autosave_runs_off_the_event_loop(tmp_path):
+    import threading
+    path = str(tmp_path / "embeddings.npz")
+    cache = EmbeddingCache(path=path, autosave_every=2)
+    threads = []
+    save = cache.save
+    cache.save = lambda: (threads.append(threading.get_ident()), save())
+    cache.put("a", "model", [0.1])
+    cache.put("b", "model", [0.2])
+    await cache._save_task
+    assert threads and threads[0] != threading.get_ident()
+    assert len(EmbeddingCache(path=path)) == 2
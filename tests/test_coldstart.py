@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from api.startup_profile import parse_importtime, by_package
+
+# Generous enough for slow CI machines; lower it locally to catch regressions early
+COLD_IMPORT_BUDGET_SECONDS = float(os.getenv("COLD_IMPORT_BUDGET_SECONDS", "1.5"))
+HEAVY_MODULES = ("openai", "pinecone", "dotenv")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def run_cold(script):
+    env = {**os.environ, "COLD_START_MODE": "true"}
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=ROOT, env=env)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cold_import_within_budget():
+    seconds = run_cold(
+        "import json, time\n"
+        "start_time = time.perf_counter()\n"
+        "import api.main\n"
+        "print(json.dumps(time.perf_counter() - start_time))\n"
+    )
+    assert seconds < COLD_IMPORT_BUDGET_SECONDS, f"Cold import of api.main took {seconds:.3f}s (budget {COLD_IMPORT_BUDGET_SECONDS}s)"
+
+def test_static_routes_do_not_import_sdks():
+    loaded = run_cold(
+        "import sys, json\n"
+        "from fastapi.testclient import TestClient\n"
+        "from api.main import app\n"
+        "client = TestClient(app)\n"
+        "assert client.get('/').status_code == 200\n"
+        "assert client.get('/version-check').status_code == 200\n"
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n"
+    )
+    assert loaded == []
+
+def test_parse_importtime():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   json.decoder\n"
+        "import time:       300 |        400 | json\n"
+        "not an import line\n"
+    )
+    rows = parse_importtime(output)
+    assert rows == [("json.decoder", 0.0001, 0.0001), ("json", 0.0003, 0.0004)]
+    assert by_package(rows) == [("json", pytest.approx(0.0004))]
@@ -0,0 +1,62 @@
+import numpy as np
+from unittest.mock import MagicMock, AsyncMock
+from api.diversify import collapse_segments, mmr, DiversifiedSearch
+
+
+def result(id, video_id, start_time, score, values=None, end_time=None):
+    metadata = {"id": video_id, "start_time": start_time, "text": f"text {id}"}
+    if end_time is not None:
+        metadata["end_time"] = end_time
+    entry = {"id": id, "score": score, "metadata": metadata, "text": f"text {id}"}
+    if values is not None:
+        entry["values"] = values
+    return entry
+
+def test_collapse_merges_adjacent_segments_of_a_video():
+    results = [
+        result("b", "video1", 40.0, 0.9),
+        result("a", "video1", 10.0, 0.8, end_time=35.0),
+        result("c", "video1", 500.0, 0.7),
+        result("d", "video2", 45.0, 0.85),
+    ]
+    collapsed = collapse_segments(results, max_gap=10.0)
+    assert [entry["id"] for entry in collapsed] == ["b", "d", "c"]
+    merged = collapsed[0]
+    assert merged["merged_ids"] == ["a", "b"]
+    assert merged["score"] == 0.9
+    assert merged["metadata"]["start_time"] == 10.0
+    assert merged["text"] == "text a text b"
+
+def test_mmr_skips_redundant_candidates():
+    vectors = np.array([[1.0, 0.0], [0.999, 0.045], [0.0, 1.0]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert mmr([0.9, 0.89, 0.5], vectors, 2, lambda_mult=0.5) == [0, 2]
+    assert mmr([0.9, 0.89, 0.5], vectors, 2, lambda_mult=1.0) == [0, 1]
+    assert mmr([], np.empty((0, 2)), 3) == []
+
+async def test_diversified_search_fetches_values_and_strips_them():
+    backend = MagicMock()
+    backend.find_nearest_async = AsyncMock(return_value=[
+        result("a", "video1", 0.0, 0.9, [1.0, 0.0]),
+        result("b", "video2", 0.0, 0.89, [1.0, 0.01]),
+        result("c", "video3", 0.0, 0.6, [0.0, 1.0]),
+    ])
+    search = DiversifiedSearch(backend, candidates=20, lambda_mult=0.5)
+    results = await search.find_nearest_async([1.0, 0.0], n_results=2, query_text="q")
+    backend.find_nearest_async.assert_awaited_once_with([1.0, 0.0], 20, query_text="q", include_values=True, filter=None)
+    assert [entry["id"] for entry in results] == ["a", "c"]
+    assert all("values" not in entry for entry in results)
+
+def test_diversify_keeps_the_hybrid_ranking():
+    dense = [result(id, f"video{i}", 0.0, 0.9 - i * 0.01, [1.0, i * 0.01]) for i, id in enumerate("abc")]
+    for rank, entry in enumerate(dense, 2):
+        entry["fusion_score"] = 1 / (60 + rank)
+    # A strong BM25 match the dense search missed: cosine score 0.0, best fused rank
+    sparse = result("s", "video9", 0.0, 0.0)
+    sparse["fusion_score"] = 2 / 61
+    search = DiversifiedSearch(MagicMock(), lambda_mult=0.7)
+
+    results = search.diversify(dense + [sparse], n_results=2)
+
+    assert [entry["id"] for entry in results] == ["s", "a"]
+    assert collapse_segments(dense + [sparse])[0]["id"] == "s"
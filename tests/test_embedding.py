@@ -1,6 +1,7 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from api.embedding import EmbeddingGenerator
+from unittest.mock import AsyncMock, MagicMock, patch
+from api.embedding import EmbeddingGenerator, shorten_embedding
+from api.cache import EmbeddingCache
 
 @pytest.fixture
 def mock_openai():
@@ -47,4 +48,98 @@ def test_search(mock_openai, mock_pinecone):
         vector=[0.1] * 3072, 
         top_k=5, 
         include_metadata=True
-    )
\ No newline at end of file
+    )
+
+def test_generate_embedding_uses_cache(mock_openai, mock_pinecone):
+    generator = EmbeddingGenerator(cache=EmbeddingCache())
+    generator.generate_embedding("test text")
+    embedding = generator.generate_embedding("test text")
+    assert len(embedding) == 3072
+    mock_openai.return_value.embeddings.create.assert_called_once()
+    assert generator.cache.stats()["hits"] == 1
+
+def test_generate_embeddings_batches_and_deduplicates(mock_openai, mock_pinecone):
+    mock_openai.return_value.embeddings.create.return_value.data = [
+        MagicMock(embedding=[0.1] * 3072),
+        MagicMock(embedding=[0.2] * 3072),
+    ]
+    generator = EmbeddingGenerator()
+    embeddings = generator.generate_embeddings(["first", "second", "first"])
+    assert len(embeddings) == 3
+    assert embeddings[0] == embeddings[2]
+    assert embeddings[1][0] == 0.2
+    mock_openai.return_value.embeddings.create.assert_called_once_with(
+        input=["first", "second"],
+        model="text-embedding-3-large"
+    )
+
+async def test_generate_embedding_async(mock_openai, mock_pinecone):
+    async_client = MagicMock()
+    async_client.embeddings.create = AsyncMock(return_value=MagicMock(data=[MagicMock(embedding=[0.3] * 3072)]))
+    generator = EmbeddingGenerator(cache=EmbeddingCache(), async_client=async_client)
+    embedding = await generator.generate_embedding_async("test text")
+    await generator.generate_embedding_async("test text")
+    assert embedding[0] == 0.3
+    async_client.embeddings.create.assert_awaited_once_with(
+        input=["test text"],
+        model="text-embedding-3-large"
+    )
+    mock_openai.return_value.embeddings.create.assert_not_called()
+
+async def test_generate_embedding_async_batches_concurrent_queries(mock_openai, mock_pinecone):
+    import asyncio
+    async_client = MagicMock()
+    async_client.embeddings.create = AsyncMock(side_effect=lambda input, **kwargs: MagicMock(data=[MagicMock(embedding=[float(len(text))]) for text in input]))
+    generator = EmbeddingGenerator(async_client=async_client, batch_window=0.01)
+    embeddings = await asyncio.gather(generator.generate_embedding_async("a"), generator.generate_embedding_async("bb"))
+    assert embeddings == [[1.0], [2.0]]
+    async_client.embeddings.create.assert_awaited_once_with(input=["a", "bb"], model="text-embedding-3-large")
+
+async def test_batch_call_wraps_each_batched_api_call(mock_openai, mock_pinecone):
+    import asyncio
+    calls = []
+
+    async def batch_call(func, texts):
+        calls.append(list(texts))
+        return await func(texts)
+
+    async_client = MagicMock()
+    async_client.embeddings.create = AsyncMock(side_effect=lambda input, **kwargs: MagicMock(data=[MagicMock(embedding=[float(len(text))]) for text in input]))
+    generator = EmbeddingGenerator(async_client=async_client, batch_window=0.01, batch_call=batch_call)
+    embeddings = await asyncio.gather(*(generator.generate_embedding_async(text) for text in ["a", "bb", "ccc"]))
+    assert embeddings == [[1.0], [2.0], [3.0]]
+    assert calls == [["a", "bb", "ccc"]]
+
+def test_generate_embedding_with_dimensions(mock_openai, mock_pinecone):
+    cache = EmbeddingCache()
+    cache.put("test text", "text-embedding-3-large", [0.5] * 3072)
+    generator = EmbeddingGenerator(cache=cache, dimensions=256)
+    generator.generate_embedding("test text")
+    mock_openai.return_value.embeddings.create.assert_called_once_with(
+        input=["test text"],
+        model="text-embedding-3-large",
+        dimensions=256
+    )
+
+def test_shorten_embedding():
+    shortened = shorten_embedding([3.0, 4.0, 12.0], 2)
+    assert shortened == pytest.approx([0.6, 0.8])
+
+async def test_pinecone_host_is_resolved_on_first_use(mock_openai, mock_pinecone):
+    pc = mock_pinecone.return_value
+    pc.describe_index.return_value.host = "index-host"
+    pc.IndexAsyncio.return_value.query = AsyncMock(return_value={"matches": []})
+    generator = EmbeddingGenerator()
+    async_index = generator.async_index
+    pc.describe_index.assert_not_called()
+    pc.Index.assert_not_called()
+
+    await async_index.query(vector=[0.1], top_k=1)
+    await async_index.query(vector=[0.1], top_k=1)
+    pc.describe_index.assert_called_once_with(generator.index_name)
+    pc.IndexAsyncio.assert_called_once_with(host="index-host")
+
+def test_known_pinecone_host_skips_describe(mock_openai, mock_pinecone):
+    generator = EmbeddingGenerator(host="index-host")
+    generator.index.describe_index_stats()
+    mock_pinecone.return_value.Index.assert_called_once_with(generator.index_name, host="index-host")
@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+from datetime import date, datetime, timezone
+from api.filters import FieldIndex, build_filter, filter_key, timestamp
+
+
+class Rows:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = len(rows)
+
+    def __iter__(self):
+        return iter((f"vec{i}", row) for i, row in enumerate(self.rows))
+
+
+ROWS = Rows([
+    {"id": "a", "author": "x", "published_at": 100},
+    {"id": "a", "author": "y", "published_at": 200},
+    {"id": "b", "author": "x", "published_at": 300},
+    {"id": "c", "published_at": 400},
+    {"id": "c", "author": "y"},
+])
+
+def test_build_filter_combines_conditions_and_inclusive_dates():
+    assert build_filter() is None
+    filter = build_filter(video_id="a", author="x", published_after=date(2024, 1, 1), published_before=date(2024, 1, 31))
+    assert filter == {
+        "id": {"$eq": "a"},
+        "author": {"$eq": "x"},
+        "published_at": {"$gte": timestamp(date(2024, 1, 1)), "$lt": timestamp(date(2024, 2, 1))},
+    }
+    end = datetime(2024, 1, 31, 12, tzinfo=timezone.utc)
+    assert build_filter(published_before=end) == {"published_at": {"$lte": int(end.timestamp())}}
+
+def test_timestamp_parses_iso_strings_as_utc():
+    assert timestamp("1970-01-02") == 86400
+    assert timestamp("1970-01-01T01:00:00Z") == 3600
+
+def test_filter_key_is_order_independent():
+    assert filter_key(None) == ""
+    assert filter_key({"a": 1, "b": 2}) == filter_key({"b": 2, "a": 1})
+
+@pytest.mark.parametrize("filter, expected", [
+    ({"id": {"$eq": "a"}}, [0, 1]),
+    ({"id": "c"}, [3, 4]),
+    ({"author": {"$ne": "x"}}, [1, 3, 4]),
+    ({"id": {"$in": ["b", "c"]}, "author": {"$nin": ["y"]}}, [2, 3]),
+    ({"published_at": {"$gt": 100, "$lte": 300}}, [1, 2]),
+    ({"published_at": {"$lt": 200}}, [0]),
+    ({"published_at": {"$eq": 400}}, [3]),
+    ({"$or": [{"id": "b"}, {"author": "y"}]}, [1, 2, 4]),
+    ({"$and": [{"id": "a"}, {"published_at": {"$gte": 200}}]}, [1]),
+    ({"author": {"$gt": 1}}, []),
+])
+def test_field_index_masks(filter, expected):
+    assert np.flatnonzero(FieldIndex(ROWS).mask(filter)).tolist() == expected
+
+def test_field_index_rejects_unknown_operators():
+    with pytest.raises(ValueError):
+        FieldIndex(ROWS).mask({"id": {"$regex": "a"}})
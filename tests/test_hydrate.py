@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock, AsyncMock
+from api.hydrate import MetadataStoreWriter, MetadataStore, HydratedSearch, main
+from api.local_index import LocalIndexWriter
+from api.search import PineconeSearch
+
+
+def build_store(path):
+    with MetadataStoreWriter(str(path), batch_size=2) as writer:
+        for i in range(5):
+            writer.add(f"vec{i}", f"chunk {i}", {"id": f"video{i}", "start_time": i * 10.0, "text": f"chunk {i}", "thumbnail": "http://img"})
+    return MetadataStore(str(path))
+
+def test_store_keeps_only_served_fields(tmp_path):
+    store = build_store(tmp_path / "metadata.sqlite")
+    metadata = store.get_many(["vec3", "vec1", "missing"])
+    assert metadata == {
+        "vec1": {"id": "video1", "start_time": 10.0, "text": "chunk 1"},
+        "vec3": {"id": "video3", "start_time": 30.0, "text": "chunk 3"},
+    }
+    assert store.get_many([]) == {}
+
+async def test_hydrated_search_queries_without_metadata(tmp_path):
+    store = build_store(tmp_path / "metadata.sqlite")
+    async_index = MagicMock()
+    async_index.query = AsyncMock(return_value={"matches": [{"id": "vec2", "score": 0.9, "metadata": None}, {"id": "gone", "score": 0.5}]})
+    search = HydratedSearch(PineconeSearch(MagicMock(), async_index, include_metadata=False), store)
+
+    results = await search.find_nearest_async([0.1], n_results=2, filter={"id": "video2"})
+
+    assert async_index.query.await_args.kwargs["include_metadata"] is False
+    assert async_index.query.await_args.kwargs["filter"] == {"id": "video2"}
+    assert results[0]["metadata"]["id"] == "video2"
+    assert results[0]["text"] == "chunk 2"
+
+def test_hydrated_search_drops_results_without_stored_metadata(tmp_path):
+    store = build_store(tmp_path / "metadata.sqlite")
+    backend = MagicMock()
+    backend.find_nearest.return_value = [{"id": "gone", "score": 0.9}, {"id": "vec1", "score": 0.5}]
+
+    results = HydratedSearch(backend, store).find_nearest([0.1], n_results=2)
+
+    assert [result["id"] for result in results] == ["vec1"]
+    assert results[0]["metadata"]["id"] == "video1"
+
+def test_build_store_from_local_index(tmp_path):
+    with LocalIndexWriter(str(tmp_path / "local")) as writer:
+        writer.add("a", [1.0, 0.0], {"id": "video", "start_time": 5.0, "text": "first"})
+    main(["--local-index", str(tmp_path / "local"), "--out", str(tmp_path / "metadata.sqlite")])
+    assert MetadataStore(str(tmp_path / "metadata.sqlite")).get_many(["a"])["a"]["text"] == "first"
@@ -0,0 +1,121 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from api.ingest import IngestionPipeline, chunk_segments
+from api.retry import call_with_retry
+from api.transcripts import TranscriptStore, TranscriptStoreWriter
+from api.local_index import LocalIndexWriter, LocalVectorIndex
+from api.bm25 import BM25IndexWriter, BM25Index
+
+
+class RateLimitError(Exception):
+    pass
+
+@pytest.fixture
+def transcript_file(tmp_path):
+    path = tmp_path / "transcripts.jsonl"
+    segments = [
+        {"video_id": f"video{v}", "start": float(i * 5), "duration": 5.0, "text": f"segment {i} of video {v}", "title": f"Video {v}"}
+        for v in range(3) for i in range(10)
+    ]
+    path.write_text("\n".join(json.dumps(segment) for segment in segments))
+    return str(path)
+
+@pytest.fixture
+def embedding_generator():
+    generator = MagicMock()
+    generator.generate_embeddings.side_effect = lambda texts: [[0.1] * 8 for _ in texts]
+    return generator
+
+def test_chunk_segments_keeps_start_time_and_video_boundaries():
+    segments = [
+        {"video_id": "a", "start": 0.0, "text": "one"},
+        {"video_id": "a", "start": 2.5, "duration": 3.0, "text": "two"},
+        {"video_id": "b", "start": 1.0, "text": "three"},
+    ]
+    chunks = list(chunk_segments(segments, max_chars=100))
+    assert [chunk["text"] for chunk in chunks] == ["one two", "three"]
+    assert chunks[0]["metadata"]["start_time"] == 0.0
+    assert chunks[0]["metadata"]["end_time"] == 5.5
+    assert chunks[1]["metadata"]["id"] == "b"
+    assert "end_time" not in chunks[1]["metadata"]
+
+def test_chunk_metadata_stores_publish_date_as_timestamp():
+    segments = [{"video_id": "a", "start": 0.0, "text": "one", "publish_date": "1970-01-02"}]
+    metadata = next(chunk_segments(segments))["metadata"]
+    assert metadata["published_at"] == 86400
+    assert "publish_date" not in metadata
+
+def test_pipeline_upserts_in_batches_and_resumes(tmp_path, transcript_file, embedding_generator):
+    checkpoint = str(tmp_path / "checkpoint")
+    index = MagicMock()
+    pipeline = IngestionPipeline(embedding_generator, index, checkpoint_path=checkpoint,
+                                 embed_batch_size=4, upsert_batch_size=3, max_chars=40)
+    stats = pipeline.run([transcript_file])
+    assert stats["upserted"] == stats["chunks"] > 0
+    assert sum(len(call.kwargs["vectors"]) for call in index.upsert.call_args_list) == stats["upserted"]
+    assert max(len(call.kwargs["vectors"]) for call in index.upsert.call_args_list) <= 3
+
+    embedding_generator.generate_embeddings.reset_mock()
+    text_index = MagicMock()
+    resumed = IngestionPipeline(embedding_generator, MagicMock(), checkpoint_path=checkpoint, max_chars=40, text_indexes=[text_index])
+    stats = resumed.run([transcript_file])
+    assert stats["upserted"] == 0
+    assert stats["skipped"] == stats["chunks"]
+    embedding_generator.generate_embeddings.assert_not_called()
+    assert text_index.add.call_count == stats["chunks"]
+    text_index.close.assert_called_once()
+
+def test_call_with_retry_retries_rate_limits():
+    func = MagicMock(side_effect=[RateLimitError(), "ok"])
+    assert call_with_retry(func, base_delay=0) == "ok"
+    assert func.call_count == 2
+
+def test_call_with_retry_raises_other_errors():
+    func = MagicMock(side_effect=ValueError())
+    with pytest.raises(ValueError):
+        call_with_retry(func, base_delay=0)
+    assert func.call_count == 1
+
+def test_pipeline_writes_every_segment_to_transcript_store(tmp_path, transcript_file, embedding_generator):
+    pipeline = IngestionPipeline(embedding_generator, MagicMock(), transcript_store=TranscriptStoreWriter(str(tmp_path / "transcripts")))
+    pipeline.run([transcript_file])
+    context = TranscriptStore(str(tmp_path / "transcripts")).context("video1", 12.0, 3.0)
+    assert context == {"start_time": 5.0, "end_time": 20.0, "text": "segment 1 of video 1 segment 2 of video 1 segment 3 of video 1"}
+
+def test_rescore_index_keeps_vectors_of_earlier_runs(tmp_path, transcript_file, embedding_generator):
+    checkpoint = str(tmp_path / "checkpoint")
+    rescore_path = str(tmp_path / "rescore")
+    first = IngestionPipeline(embedding_generator, MagicMock(), checkpoint_path=checkpoint, max_chars=40,
+                              index_dimensions=4, full_vector_index=LocalIndexWriter(rescore_path, append=True))
+    stats = first.run([transcript_file])
+
+    more = tmp_path / "more.jsonl"
+    more.write_text(json.dumps({"video_id": "video9", "start": 0.0, "text": "a later video"}))
+    second = IngestionPipeline(embedding_generator, MagicMock(), checkpoint_path=checkpoint, max_chars=40,
+                               index_dimensions=4, full_vector_index=LocalIndexWriter(rescore_path, append=True))
+    resumed = second.run([transcript_file, str(more)])
+
+    assert resumed["skipped"] == stats["chunks"]
+    index = LocalVectorIndex(rescore_path)
+    assert index.count == stats["chunks"] + 1
+    assert {index.row(position)[1]["id"] for position in range(index.count)} == {"video0", "video1", "video2", "video9"}
+
+def test_bm25_index_keeps_documents_of_earlier_runs(tmp_path, embedding_generator):
+    checkpoint = str(tmp_path / "checkpoint")
+    bm25_path = str(tmp_path / "bm25")
+    first = tmp_path / "a.jsonl"
+    first.write_text(json.dumps({"video_id": "a", "start": 0.0, "text": "volcano eruption"}))
+    second = tmp_path / "b.jsonl"
+    # The same segment twice in one run is indexed once
+    second.write_text("\n".join(json.dumps({"video_id": "b", "start": 0.0, "text": "glacier retreat"}) for _ in range(2)))
+
+    for path in (first, second):
+        pipeline = IngestionPipeline(embedding_generator, MagicMock(), checkpoint_path=checkpoint, max_chars=20,
+                                     text_indexes=[BM25IndexWriter(bm25_path, append=True)])
+        pipeline.run([str(path)])
+
+    index = BM25Index(bm25_path)
+    assert index.count == 2
+    assert [result["metadata"]["id"] for result in index.search("volcano")] == ["a"]
+    assert [result["metadata"]["id"] for result in index.search("glacier")] == ["b"]
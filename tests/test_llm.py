@@ -1,6 +1,6 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from api.llm import LLMHandler
+from unittest.mock import AsyncMock, MagicMock, patch
+from api.llm import LLMHandler, RankedMatchParser, RankedJsonParser
 
 @pytest.fixture
 def mock_openai():
@@ -62,4 +62,94 @@ def test_find_best_match_no_clear_match(mock_openai):
     
     assert video_id is None
     assert timestamp is None
-    assert explanation == "No clear best match found."
\ No newline at end of file
+    assert explanation == "No clear best match found."
+
+async def test_find_best_match_async_returns_none_without_a_usable_match(mock_openai):
+    async_client = MagicMock()
+    handler = LLMHandler("gpt-4", async_client=async_client)
+    search_results = [{'id': '1', 'score': 0.9, 'metadata': {'id': 'video1', 'start_time': '60', 'text': 'document one'}, 'text': 'document one'}]
+
+    for content in ('{"matches": []}', '{"matches": [{"i": 4, "why": "Out of range."}]}', 'Best match: none'):
+        async_client.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=MagicMock(content=content))]))
+        assert await handler.find_best_match_async("test query", search_results) is None
+
+    async_client.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[
+        MagicMock(message=MagicMock(content='Best match: [1]\nBrief explanation: Bracketed index.'))
+    ]))
+    assert await handler.find_best_match_async("test query", search_results) == ('video1', '60', 'Bracketed index.', 'document one')
+
+async def test_find_best_matches_async(mock_openai):
+    async_client = MagicMock()
+    async_client.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[
+        MagicMock(message=MagicMock(content='1. 2\n   Explanation: Second is best.\n2. 1\n   Explanation: First is fine.'))
+    ]))
+    handler = LLMHandler("gpt-4", async_client=async_client)
+    search_results = [
+        {'id': '1', 'score': 0.9, 'metadata': {'id': 'video1'}, 'text': 'This is document 1'},
+        {'id': '2', 'score': 0.8, 'metadata': {'id': 'video2'}, 'text': 'This is document 2'},
+    ]
+
+    matches = await handler.find_best_matches_async("test query", search_results)
+
+    assert [(match['id'], explanation) for match, explanation in matches] == [('2', 'Second is best.'), ('1', 'First is fine.')]
+    mock_openai.return_value.chat.completions.create.assert_not_called()
+
+def test_ranked_match_parser_emits_matches_incrementally():
+    search_results = [{'id': str(i), 'text': f'document {i}'} for i in range(1, 4)]
+    parser = RankedMatchParser(search_results, 5)
+    content = '1. 3\n   Explanation: Third is best.\n2. 1\n   Explanation: First is close.\n3. 2'
+
+    emitted = [parser.feed(content[i:i + 7]) for i in range(0, len(content), 7)]
+    matches = [match for batch in emitted for match in batch] + parser.close()
+
+    assert [(match['id'], explanation) for match, explanation in matches] == [
+        ('3', 'Third is best.'), ('1', 'First is close.'), ('2', '')
+    ]
+    assert matches[0] in [match for batch in emitted[:6] for match in batch]
+
+def test_ranked_match_parser_keeps_multiline_explanations():
+    search_results = [{'id': str(i), 'text': f'document {i}'} for i in range(1, 3)]
+    parser = RankedMatchParser(search_results, 5)
+
+    assert parser.feed('1. 2\n   Explanation: First line\n   continues here.\n') == []
+    assert parser.feed('2. 1\n') == [(search_results[1], 'First line continues here.')]
+    parser.feed('   Explanation: Short.')
+    assert parser.close() == [(search_results[0], 'Short.')]
+
+def test_find_best_matches_structured_output(mock_openai):
+    mock_openai.return_value.chat.completions.create.return_value.choices = [
+        MagicMock(message=MagicMock(content='{"matches": [{"i": 2, "why": "Exact phrase."}, {"i": 9, "why": "Out of range."}, {"i": 1, "why": "Related."}]}'))
+    ]
+    handler = LLMHandler("gpt-4")
+    search_results = [
+        {'id': '1', 'score': 0.9, 'metadata': {'id': 'video1'}, 'text': 'This is document one'},
+        {'id': '2', 'score': 0.8, 'metadata': {'id': 'video2'}, 'text': 'Something else entirely'},
+    ]
+
+    matches = handler.find_best_matches("test query", search_results)
+
+    assert [(match['id'], explanation) for match, explanation in matches] == [('2', 'Exact phrase.'), ('1', 'Related.')]
+    kwargs = mock_openai.return_value.chat.completions.create.call_args.kwargs
+    assert kwargs["response_format"]["type"] == "json_schema"
+
+def test_find_best_matches_keeps_complete_matches_of_a_truncated_reply(mock_openai):
+    mock_openai.return_value.chat.completions.create.return_value.choices = [
+        MagicMock(message=MagicMock(content='{"matches": [{"i": 2, "why": "Exact phrase."}, {"i": 1, "why": "Rel'))
+    ]
+    handler = LLMHandler("gpt-4")
+    search_results = [{'id': '1', 'text': 'document one'}, {'id': '2', 'text': 'document two'}]
+
+    matches = handler.find_best_matches("test query", search_results)
+
+    assert [(match['id'], explanation) for match, explanation in matches] == [('2', 'Exact phrase.')]
+
+def test_ranked_json_parser_emits_matches_incrementally():
+    search_results = [{'id': str(i)} for i in range(1, 4)]
+    parser = RankedJsonParser(search_results)
+    content = '{"matches":[{"i":3,"why":"Best \\"quote\\"."},{"i":1,"why":"Close."}]}'
+
+    first = parser.feed(content[:content.index("}") + 1])
+    rest = parser.feed(content[content.index("}") + 1:])
+
+    assert [(match['id'], why) for match, why in first] == [('3', 'Best "quote".')]
+    assert [(match['id'], why) for match, why in rest] == [('1', 'Close.')]
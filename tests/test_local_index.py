@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from api.local_index import LocalIndexWriter, LocalVectorIndex, RescoringSearch, export_pinecone_index
+
+
+def build_index(path, dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).astype(np.float32)
+    with LocalIndexWriter(str(path), dtype=dtype) as writer:
+        for i, vector in enumerate(vectors):
+            metadata = {"id": f"video{i}", "start_time": str(i * 10.0), "text": f"chunk {i}"}
+            if i % 2:
+                metadata["author"] = "someone"
+            writer.add(f"vec{i}", vector, metadata)
+    return vectors
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_find_nearest_matches_exact_search(tmp_path, dtype):
+    vectors = build_index(tmp_path, dtype)
+    index = LocalVectorIndex(str(tmp_path))
+    query = vectors[7] + 0.01
+
+    results = index.find_nearest(query.tolist(), n_results=5)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+    assert [result["id"] for result in results] == [f"vec{i}" for i in expected]
+    assert results[0]["text"] == "chunk 7"
+    assert results[0]["metadata"]["id"] == "video7"
+    assert results[0]["metadata"]["author"] == "someone"
+    assert "author" not in index.row(0)[1]
+    assert results[0]["score"] == pytest.approx(1.0, abs=0.02)
+
+    with_values = index.find_nearest(query.tolist(), n_results=1, include_values=True)[0]
+    assert np.dot(with_values["values"], normalized[7]) == pytest.approx(1.0, abs=0.02)
+
+def test_find_nearest_with_more_results_than_vectors(tmp_path):
+    build_index(tmp_path, "float16")
+    index = LocalVectorIndex(str(tmp_path))
+    assert len(index.find_nearest([0.1] * 16, n_results=100)) == 50
+
+def test_find_nearest_scores_only_rows_matching_filter(tmp_path):
+    vectors = build_index(tmp_path, "float16")
+    index = LocalVectorIndex(str(tmp_path))
+
+    results = index.find_nearest(vectors[7].tolist(), n_results=100, filter={"author": {"$eq": "someone"}})
+    assert len(results) == 25
+    assert results[0]["id"] == "vec7"
+    assert all(result["metadata"]["author"] == "someone" for result in results)
+    assert [result["id"] for result in index.find_nearest(vectors[7].tolist(), n_results=5, filter={"id": "video8"})] == ["vec8"]
+
+def test_export_pinecone_index(tmp_path):
+    pinecone_index = MagicMock()
+    pinecone_index.list.return_value = iter([["a", "b"]])
+    pinecone_index.fetch.return_value.vectors = {
+        "a": MagicMock(values=[1.0, 0.0], metadata={"text": "first"}),
+        "b": MagicMock(values=[0.0, 1.0], metadata={"text": "second"}),
+    }
+
+    assert export_pinecone_index(pinecone_index, str(tmp_path)) == 2
+    results = LocalVectorIndex(str(tmp_path)).find_nearest([0.0, 1.0], n_results=1)
+    assert results[0]["id"] == "b"
+    assert results[0]["text"] == "second"
+
+async def test_rescoring_search_reorders_by_full_vectors(tmp_path):
+    full_vectors = {"a": [1.0, 0.0, 0.0, 0.0], "b": [0.6, 0.0, 0.8, 0.0], "c": [0.0, 1.0, 0.0, 0.0]}
+    with LocalIndexWriter(str(tmp_path)) as writer:
+        for id, values in full_vectors.items():
+            writer.add(id, values, {"text": id})
+    coarse = MagicMock()
+    coarse.find_nearest_async = AsyncMock(return_value=[
+        {"id": "a", "score": 0.9, "metadata": {}, "text": "a"},
+        {"id": "b", "score": 0.8, "metadata": {}, "text": "b"},
+        {"id": "missing", "score": 0.7, "metadata": {}, "text": "missing"},
+    ])
+    search = RescoringSearch(coarse, LocalVectorIndex(str(tmp_path)), dimensions=2, candidates=20)
+
+    results = await search.find_nearest_async([0.0, 0.0, 1.0, 0.0], n_results=3)
+
+    assert coarse.find_nearest_async.call_args.args[1] == 20
+    assert [result["id"] for result in results] == ["b", "a", "missing"]
+    assert results[0]["score"] == pytest.approx(0.8, abs=0.01)
+    assert results[0]["coarse_score"] == 0.8
+
+def test_append_keeps_existing_rows_and_requantizes(tmp_path):
+    path = str(tmp_path / "index")
+    with LocalIndexWriter(path, dtype="int8") as writer:
+        writer.add("a", [1.0, 0.0], {"id": "video_a"})
+    with LocalIndexWriter(path, append=True) as writer:
+        writer.add("a", [0.0, 1.0], {"id": "changed"})
+        writer.add("b", [0.0, 1.0], {"id": "video_b"})
+    index = LocalVectorIndex(path)
+    assert [result["id"] for result in index.find_nearest([1.0, 0.1], n_results=2)] == ["a", "b"]
+    assert index.row(0) == ("a", {"id": "video_a"})
+    assert index.manifest["dtype"] == "float16"
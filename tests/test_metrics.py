@@ -0,0 +1,42 @@
+import pytest
+from api.metrics import Counter, Histogram, Registry, track_stage, STAGE_SECONDS, UPSTREAM_ERRORS
+
+
+def test_render_uses_prometheus_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests served", ("route",)))
+    requests.inc(route="/search/")
+    requests.inc(2, route="/search/")
+    text = registry.render()
+    assert "# HELP requests_total Requests served" in text
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/search/"} 3' in text
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+    assert histogram.count() == 3
+
+def test_track_stage_counts_upstream_errors():
+    before = UPSTREAM_ERRORS.value(upstream="openai", stage="embedding")
+    observed = STAGE_SECONDS.count(endpoint="test", stage="embedding")
+    with pytest.raises(RuntimeError):
+        with track_stage("test", "embedding", upstream="openai"):
+            raise RuntimeError("boom")
+    assert UPSTREAM_ERRORS.value(upstream="openai", stage="embedding") == before + 1
+    assert STAGE_SECONDS.count(endpoint="test", stage="embedding") == observed + 1
+
+def test_cache_requests_count_up_across_cache_resets():
+    from api.metrics import CACHE_REQUESTS, record_cache_stats
+    record_cache_stats("test", {"hits": 3, "misses": 1, "hit_ratio": 0.75})
+    record_cache_stats("test", {"hits": 5, "misses": 1, "hit_ratio": 5 / 6})
+    # Cleared caches count from zero again
+    record_cache_stats("test", {"hits": 2, "misses": 0, "hit_ratio": 1.0})
+    assert CACHE_REQUESTS.value(cache="test", result="hit") == 7
+    assert CACHE_REQUESTS.value(cache="test", result="miss") == 1
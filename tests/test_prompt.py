@@ -0,0 +1,27 @@
+from api.prompt import PromptBuilder, estimate_tokens
+
+
+def result(text, score=0.5):
+    return {'id': text[:10], 'score': score, 'metadata': {}, 'text': text}
+
+def test_build_drops_near_duplicates():
+    builder = PromptBuilder()
+    text = "he tries to keep the ball up in a one versus one and fails badly"
+    candidates = builder.build("ball keep up", [result(text), result(text + " again"), result("a completely different topic")])
+    assert [snippet for _, snippet in candidates] == [text, "a completely different topic"]
+
+def test_window_centers_on_query_terms():
+    builder = PromptBuilder(token_budget=100, max_candidate_tokens=10)
+    filler = " ".join(["filler"] * 200)
+    text = f"{filler} the legendary keepy uppy fail happened here {filler}"
+    (_, snippet), = builder.build("keepy uppy fail", [result(text)])
+    assert "keepy uppy fail" in snippet
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert estimate_tokens(snippet) <= 20
+
+def test_build_respects_total_budget():
+    builder = PromptBuilder(token_budget=300, max_candidate_tokens=200)
+    results = [result(f"topic {i} " + " ".join(f"word{i}_{j}" for j in range(300))) for i in range(10)]
+    candidates = builder.build("topic", results)
+    assert len(candidates) == 10
+    assert sum(estimate_tokens(snippet) for _, snippet in candidates) <= 300 * 1.5
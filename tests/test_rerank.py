@@ -0,0 +1,150 @@
+import asyncio
+from api.rerank import RerankPolicy, SKIPPED_TOP_SCORE, SKIPPED_MARGIN, DEADLINE_EXCEEDED, vector_order_matches
+
+
+def results(*scores):
+    return [{'id': str(i), 'score': score, 'metadata': {'id': f'video{i}'}, 'text': ''} for i, score in enumerate(scores)]
+
+def test_skip_reason():
+    policy = RerankPolicy(score_threshold=0.8, margin_threshold=0.1)
+    assert policy.skip_reason(results(0.85, 0.84)) == SKIPPED_TOP_SCORE
+    assert policy.skip_reason(results(0.6, 0.45)) == SKIPPED_MARGIN
+    assert policy.skip_reason(results(0.6, 0.55)) is None
+    assert RerankPolicy().skip_reason(results(0.99, 0.1)) is None
+
+async def test_run_skips_llm_for_clear_winner():
+    policy = RerankPolicy(score_threshold=0.8)
+    calls = []
+
+    async def rerank():
+        calls.append(1)
+
+    search_results = results(0.9, 0.5)
+    matches, reason = await policy.run(search_results, rerank, lambda: vector_order_matches(search_results))
+    assert reason == SKIPPED_TOP_SCORE
+    assert calls == []
+    assert matches[0][0]['id'] == '0'
+
+async def test_run_falls_back_after_deadline():
+    policy = RerankPolicy(deadline=0.01)
+    cancelled = asyncio.Event()
+
+    async def rerank():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    search_results = results(0.5, 0.4)
+    matches, reason = await policy.run(search_results, rerank, lambda: vector_order_matches(search_results))
+    assert reason == DEADLINE_EXCEEDED
+    assert cancelled.is_set()
+    assert [match['id'] for match, _ in matches] == ['0', '1']
+
+async def test_run_uses_llm_result():
+    async def rerank():
+        return "reranked"
+
+    assert await RerankPolicy(deadline=1).run(results(0.5), rerank, lambda: "fallback") == ("reranked", None)
+
+async def test_run_falls_back_when_llm_is_overloaded():
+    from api.upstream import Overloaded
+    from api.rerank import OVERLOADED
+
+    async def rerank():
+        raise Overloaded("openai_chat", 1)
+
+    search_results = results(0.6, 0.55)
+    matches, reason = await RerankPolicy().run(search_results, rerank, lambda: vector_order_matches(search_results))
+    assert reason == OVERLOADED
+    assert matches[0][0]['id'] == '0'
+
+async def test_stream_takes_a_slot_only_for_the_llm():
+    from contextlib import asynccontextmanager
+    slots = []
+
+    @asynccontextmanager
+    async def slot():
+        slots.append(1)
+        yield
+
+    async def rerank():
+        yield search_results[1], "Better"
+
+    search_results = results(0.9, 0.5)
+    ranked = RerankPolicy(score_threshold=0.8).stream(search_results, rerank, slot)
+    assert [match['id'] async for match, _ in ranked] == ['0', '1']
+    assert ranked.skip_reason == SKIPPED_TOP_SCORE
+    assert slots == []
+
+    ranked = RerankPolicy().stream(search_results, rerank, slot, num_matches=1)
+    assert [(match['id'], explanation) async for match, explanation in ranked] == [('1', 'Better')]
+    assert ranked.skip_reason is None
+    assert slots == [1]
+
+async def test_stream_falls_back_when_llm_is_overloaded():
+    from api.upstream import UpstreamLimiter
+    from api.rerank import OVERLOADED
+    limiter = UpstreamLimiter("openai_chat", max_concurrency=1, max_queue=0)
+    limiter.active = 1
+
+    async def rerank():
+        raise AssertionError("the LLM should not be called")
+        yield
+
+    search_results = results(0.6, 0.55)
+    ranked = RerankPolicy().stream(search_results, rerank, limiter.slot)
+    assert [match['id'] async for match, _ in ranked] == ['0', '1']
+    assert ranked.skip_reason == OVERLOADED
+
+async def test_stream_completes_in_vector_order_after_deadline():
+    closed = asyncio.Event()
+
+    async def rerank():
+        try:
+            yield search_results[2], "Best"
+            await asyncio.sleep(1)
+            yield search_results[0], "Too late"
+        finally:
+            closed.set()
+
+    search_results = results(0.5, 0.45, 0.4)
+    ranked = RerankPolicy(deadline=0.05).stream(search_results, rerank, asyncio.Lock, num_matches=3)
+    matches = [(match['id'], explanation) async for match, explanation in ranked]
+    assert matches == [('2', 'Best'), ('0', None), ('1', None)]
+    assert ranked.skip_reason == DEADLINE_EXCEEDED
+    assert closed.is_set()
+
+async def test_run_falls_back_when_llm_ranks_nothing():
+    from api.rerank import NO_RANKING
+
+    async def rerank():
+        return []
+
+    search_results = results(0.6, 0.55)
+    matches, reason = await RerankPolicy().run(search_results, rerank, lambda: vector_order_matches(search_results))
+    assert reason == NO_RANKING
+    assert [match['id'] for match, _ in matches] == ['0', '1']
+
+def test_complete_matches_tops_up_in_vector_order():
+    from api.rerank import complete_matches
+    search_results = results(0.6, 0.5, 0.4, 0.3)
+    matches = complete_matches([(search_results[2], "Best")], search_results, num_matches=3)
+    assert [(match['id'], explanation) for match, explanation in matches] == [('2', 'Best'), ('0', None), ('1', None)]
+
+async def test_run_and_stream_skip_llm_without_results():
+    from api.rerank import vector_order_match
+
+    async def rerank():
+        raise AssertionError("the LLM should not be called")
+
+    assert await RerankPolicy().run([], rerank, lambda: vector_order_match([])) == ((None, None, "No clear best match found.", None), None)
+
+    async def stream():
+        raise AssertionError("the LLM should not be called")
+        yield
+
+    ranked = RerankPolicy().stream([], stream, asyncio.Lock)
+    assert [match async for match in ranked] == []
+    assert ranked.skip_reason is None
@@ -0,0 +1,58 @@
+import gzip
+import json
+from unittest.mock import MagicMock, patch
+from api.responses import CompressedJSONResponse, FastJSONResponse, conditional_response, dumps, negotiate_encoding
+
+
+def request_with(headers):
+    request = MagicMock()
+    request.headers = headers
+    return request
+
+def test_dumps_matches_json():
+    content = {"text": "café", "score": 0.5, "results": [1, None]}
+    assert json.loads(dumps(content)) == content
+
+def test_negotiate_encoding_prefers_brotli_when_available():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    with patch("api.responses._brotli", return_value=MagicMock()):
+        assert negotiate_encoding("gzip, br") == "br"
+    with patch("api.responses._brotli", return_value=None):
+        assert negotiate_encoding("gzip, br") == "gzip"
+
+def test_compressed_response_skips_small_bodies():
+    content = {"results": [{"text": "transcript " * 200}]}
+    response = CompressedJSONResponse(content, "gzip", min_size=100)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(response.body)) == content
+    assert int(response.headers["content-length"]) == len(response.body)
+
+    small = CompressedJSONResponse({"results": []}, "gzip", min_size=100)
+    assert "content-encoding" not in small.headers
+    assert json.loads(small.body) == {"results": []}
+
+def test_conditional_response_returns_304_for_matching_etag():
+    response = conditional_response(request_with({}), FastJSONResponse({"a": 1}), "public, max-age=60")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+    not_modified = conditional_response(request_with({"if-none-match": f'"other", W/{etag}'}), FastJSONResponse({"a": 1}), "public, max-age=60")
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert conditional_response(request_with({"if-none-match": etag}), FastJSONResponse({"a": 2}), "no-store").status_code == 200
+
+def test_gzip_etag_is_stable_across_requests():
+    content = {"results": [{"text": "transcript " * 200}]}
+    with patch("time.time", return_value=1000.0):
+        first = conditional_response(request_with({}), CompressedJSONResponse(content, "gzip", min_size=100), "private")
+    with patch("time.time", return_value=2000.0):
+        second = conditional_response(request_with({}), CompressedJSONResponse(content, "gzip", min_size=100), "private")
+    assert first.headers["etag"] == second.headers["etag"]
+
+def test_conditional_response_adds_vary_headers():
+    response = conditional_response(request_with({}), CompressedJSONResponse({"a": 1}, "gzip"), "private", vary=("X-API-Key",))
+    assert response.headers["vary"] == "Accept-Encoding, X-API-Key"
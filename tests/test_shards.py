@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from api.shards import ShardedSearch, merge_top_k, parse_shards, track_missing_shards
+
+
+def results(*scores, prefix="r"):
+    return [{"id": f"{prefix}{score}", "score": score} for score in scores]
+
+class Shard:
+    def __init__(self, results=None, delay=0.0, error=None):
+        self.results = results or []
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    def find_nearest(self, query_embedding, n_results=10, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return self.results[:n_results]
+
+    async def find_nearest_async(self, query_embedding, n_results=10, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.find_nearest(query_embedding, n_results, **kwargs)
+
+def test_parse_shards():
+    assert parse_shards("a, b:ns1, :ns2,", "default") == [("a", None), ("b", "ns1"), ("default", "ns2")]
+    assert parse_shards("", "default") == []
+
+def test_merge_top_k_keeps_global_order():
+    merged = merge_top_k([results(0.9, 0.5, 0.1), results(0.8, 0.7, prefix="s"), []], 4)
+    assert [result["score"] for result in merged] == [0.9, 0.8, 0.7, 0.5]
+
+async def test_sharded_search_merges_all_shards():
+    a, b = Shard(results(0.9, 0.3)), Shard(results(0.6, 0.5, prefix="s"))
+    search = ShardedSearch([("a", a), ("b", b)], timeout=1.0)
+    missing = track_missing_shards()
+
+    merged = await search.find_nearest_async([0.1], n_results=3, filter={"id": "x"})
+
+    assert [result["score"] for result in merged] == [0.9, 0.6, 0.5]
+    assert a.calls[0]["filter"] == b.calls[0]["filter"] == {"id": "x"}
+    assert missing == set()
+
+async def test_slow_and_failing_shards_give_partial_results():
+    search = ShardedSearch([("fast", Shard(results(0.4))), ("slow", Shard(results(0.9), delay=1.0)), ("down", Shard(error=RuntimeError("boom")))], timeout=0.05)
+    missing = track_missing_shards()
+
+    merged = await search.find_nearest_async([0.1], n_results=3)
+
+    assert [result["score"] for result in merged] == [0.4]
+    assert missing == {"slow", "down"}
+
+async def test_no_answering_shard_raises():
+    search = ShardedSearch([("down", Shard(error=RuntimeError("boom")))], timeout=0.05)
+    with pytest.raises(RuntimeError):
+        await search.find_nearest_async([0.1])
+    search = ShardedSearch([("slow", Shard(delay=1.0))], timeout=0.05)
+    with pytest.raises(TimeoutError):
+        await search.find_nearest_async([0.1])
+
+def test_sync_find_nearest_merges_shards():
+    search = ShardedSearch([("a", Shard(results(0.2))), ("b", Shard(results(0.7, prefix="s")))], timeout=1.0)
+    assert [result["id"] for result in search.find_nearest([0.1], n_results=2)] == ["s0.7", "r0.2"]
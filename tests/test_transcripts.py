@@ -0,0 +1,38 @@
+import pytest
+from api.transcripts import TranscriptStore, TranscriptStoreWriter
+
+
+@pytest.fixture
+def store(tmp_path):
+    with TranscriptStoreWriter(str(tmp_path)) as writer:
+        writer.add({"video_id": "b", "start": 0.0, "duration": 4.0, "text": "other video"})
+        # Out of order, and the last segment has no duration
+        for start, text in [(20.0, "three"), (0.0, "one"), (10.0, "two"), (30.0, "four")]:
+            writer.add({"video_id": "a", "start": start, "duration": 5.0, "text": text})
+        writer.add({"video_id": "a", "start_time": 40.0, "text": "fünf"})
+        writer.add({"video_id": "a", "start": 50.0, "text": "  "})
+    return TranscriptStore(str(tmp_path))
+
+def test_context_returns_segments_around_timestamp(store):
+    assert store.context("a", 20.0, 8.0) == {"start_time": 10.0, "end_time": 25.0, "text": "two three"}
+    # A window starting mid-segment includes that segment
+    assert store.context("a", 14.0, 1.0)["text"] == "two"
+    # A window starting in a gap between segments skips the one before it
+    assert store.context("a", 18.5, 2.5)["text"] == "three"
+    assert store.context("a", 45.0, 10.0) == {"start_time": 30.0, "end_time": 40.0, "text": "four fünf"}
+    assert store.context("b", 1.0, 60.0)["text"] == "other video"
+
+def test_context_for_unknown_video_or_empty_window(store):
+    assert store.context("missing", 10.0, 5.0) is None
+    assert store.context("a", 100.0, 5.0) is None
+
+def test_writer_keeps_videos_from_earlier_runs(store, tmp_path):
+    store.close()
+    with TranscriptStoreWriter(str(tmp_path)) as writer:
+        writer.add({"video_id": "b", "start": 0.0, "duration": 4.0, "text": "new take"})
+        writer.add({"video_id": "c", "start": 5.0, "duration": 4.0, "text": "third video"})
+    merged = TranscriptStore(str(tmp_path))
+    assert merged.context("a", 20.0, 8.0) == {"start_time": 10.0, "end_time": 25.0, "text": "two three"}
+    assert merged.context("a", 45.0, 10.0)["text"] == "four fünf"
+    assert merged.context("b", 1.0, 60.0)["text"] == "new take"
+    assert merged.context("c", 5.0, 1.0)["text"] == "third video"
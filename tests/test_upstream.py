@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from api.upstream import UpstreamLimiter, Overloaded, HedgedSearch, LatencyWindow, call_upstream
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+async def test_limiter_queues_then_sheds():
+    limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+    order = []
+
+    async def call(name):
+        async with limiter.slot():
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.ensure_future(call("first"))
+    second = asyncio.ensure_future(call("second"))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as error:
+        await call("third")
+    assert error.value.status_code == 503
+    assert error.value.retry_after >= 1
+    release.set()
+    await asyncio.gather(first, second)
+    assert order == ["first", "second"]
+    assert limiter.active == 0
+
+async def test_limiter_queue_timeout():
+    limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=10, queue_timeout=0.01)
+    await limiter.acquire()
+    with pytest.raises(Overloaded):
+        await limiter.acquire()
+    limiter.release()
+    assert limiter.active == 0
+
+async def test_call_upstream_retries_rate_limits_then_answers_429():
+    limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=1)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise RateLimitError()
+        return "ok"
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("api.retry.backoff_delay", lambda *args: 0)
+        assert await call_upstream(limiter, flaky) == "ok"
+
+        async def always_limited():
+            raise RateLimitError()
+
+        with pytest.raises(Overloaded) as error:
+            await call_upstream(limiter, always_limited, max_attempts=2)
+    assert error.value.status_code == 429
+
+def test_latency_window_quantile():
+    window = LatencyWindow(size=4)
+    assert window.quantile(0.95) is None
+    for seconds in (1, 2, 3, 4, 100):
+        window.add(seconds)
+    assert window.quantile(1.0) == 100
+    assert window.quantile(0.0) == 2
+
+async def test_hedged_search_takes_the_faster_answer():
+    delays = [1.0, 0.0]
+
+    async def find_nearest_async(query_embedding, n_results, query_text=None, include_values=False, filter=None):
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return [{"id": f"slept{delay}"}]
+
+    backend = MagicMock()
+    backend.find_nearest_async = find_nearest_async
+    search = HedgedSearch(backend, initial_delay=0.01)
+    results = await asyncio.wait_for(search.find_nearest_async([0.1], 5), timeout=0.5)
+    assert results == [{"id": "slept0.0"}]
+
+async def test_hedged_search_skips_hedge_without_a_free_slot():
+    calls = []
+
+    async def find_nearest_async(query_embedding, n_results, query_text=None, include_values=False, filter=None):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return [{"id": "primary"}]
+
+    backend = MagicMock()
+    backend.find_nearest_async = find_nearest_async
+    limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=0)
+    async with limiter.slot():
+        search = HedgedSearch(backend, initial_delay=0.01, limiter=limiter)
+        assert await search.find_nearest_async([0.1], 5) == [{"id": "primary"}]
+    assert calls == [1]
+    assert limiter.active == 0
+
+async def test_cancelled_hedged_search_cancels_its_queries():
+    started, cancelled = [], []
+
+    async def find_nearest_async(query_embedding, n_results, query_text=None, include_values=False, filter=None):
+        started.append(1)
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return [{"id": "late"}]
+
+    backend = MagicMock()
+    backend.find_nearest_async = find_nearest_async
+    limiter = UpstreamLimiter("test", max_concurrency=2, max_queue=0)
+    search = HedgedSearch(backend, initial_delay=0.01, limiter=limiter)
+    for delay in (0.005, 0.05):
+        started.clear()
+        cancelled.clear()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(search.find_nearest_async([0.1], 5), timeout=delay)
+        await asyncio.sleep(0)
+        assert cancelled == started
+    assert started == [1, 1]
+    assert limiter.active == 0